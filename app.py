@@ -1,148 +1,2209 @@
 # app.py - Flask backend server for IELTS Examiner application
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from flask import Flask, request, jsonify, send_file, send_from_directory, Response, stream_with_context
 import requests
+import click
 import os
 import json
 import io
 import base64
 from gtts import gTTS
 import re
+import tempfile
+import threading
+import time
+import uuid
+import hashlib
+import heapq
+import itertools
+import math
+import shutil
+import subprocess
+import wave
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from flask_sock import Sock
+except ImportError:  # WebSocket punctuation is optional; clients fall back to /api/punctuate/batch
+    Sock = None
 
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 
 app = Flask(__name__, static_folder='static')
 
 class SimplePunctuator:
-    def __init__(self):
-        self.sentence_endings = r'([.!?])\s+'
-        self.comma_patterns = [
-            r'(,)\s+',
-            r'\b(but|and|or|nor|for|so|yet)\b',
-            r'\b(however|moreover|furthermore|therefore|nevertheless|meanwhile|consequently)\b',
-            r'\b(in addition|as a result|for example|for instance)\b',
-        ]
-    
-    def capitalize_sentences(self, text):
-        sentences = re.split(self.sentence_endings, text)
-        result = []
-        for i in range(0, len(sentences), 2):
-            if i < len(sentences):
-                sentence = sentences[i].strip()
-                if sentence:
-                    sentence = sentence[0].upper() + sentence[1:] if len(sentence) > 1 else sentence.upper()
-                    result.append(sentence)
-                if i + 1 < len(sentences):
-                    result.append(sentences[i + 1])
-        return ' '.join(result)
+    """Heuristic punctuation and capitalization for ASR transcripts.
+
+    The whitespace-normalized text is scanned once by a single precompiled tokenizer that only stops at
+    tokens a rule cares about; a small state machine walks those tokens in order and copies the text
+    between them in slices. Nothing backtracks, so the cost is linear however long an unpunctuated
+    transcript gets.
+
+    The rules, and their output, are those of the earlier regex cascade: a period between a lowercase
+    word end and a capitalized word; a question mark from a question word up to the next sentence mark;
+    a comma before a conjunction, linking adverb or linking phrase; sentences capitalized and sentence
+    marks set off by spaces.
+    """
+
+    # Words only count as comma triggers when they stand alone and no period is about to be attached to them
+    TOKENS = re.compile(
+        r' (?:(?P<phrase>in addition|as a result|for example|for instance)'
+        r'|(?P<conjunction>but|and|or|nor|for|so|yet)'
+        r'|(?P<adverb>however|moreover|furthermore|therefore|nevertheless|meanwhile|consequently))'
+        r'(?= (?![A-Z]))'
+        r'|(?P<sentence_break> )(?<=[a-z] )(?=[A-Z])'
+        r'|(?P<question>\b(?i:what|who|where|when|why|how|which|whose|whom)\b)'
+        r'|(?P<mark>[.!?,])'
+    )
 
     def add_punctuation(self, text):
-        # Remove existing punctuation and extra spaces
         text = ' '.join(text.split())
-        
-        # Add periods for sentence-like structures
-        text = re.sub(r'(?<=[.!?])\s+', ' ', text)
-        text = re.sub(r'(?<=[a-z])\s+(?=[A-Z])', '. ', text)
-        
-        # Add question marks for questions
-        text = re.sub(r'\b(what|who|where|when|why|how|which|whose|whom)\b.*?(?=[.!?]|\Z)', 
-                     lambda m: m.group(0) + '?', 
-                     text, 
-                     flags=re.IGNORECASE)
-        
-        # Add commas
-        for pattern in self.comma_patterns:
-            text = re.sub(f'\\s+{pattern}\\s+', r', \1 ', text)
-        
-        # Clean up spacing around punctuation
-        text = re.sub(r'\s+([.!?,])', r'\1', text)
-        text = re.sub(r'([.!?,])', r'\1 ', text)
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Capitalize sentences
-        text = self.capitalize_sentences(text)
-        
-        return text.strip()
+        tokens = [(match.lastgroup, match.start(), match.end()) for match in self.TOKENS.finditer(text)]
+
+        output = []     # finished sentences and the marks between them
+        piece = []      # the sentence being built: text fragments and commas
+        cursor = 0      # text before this position has been emitted
+
+        def emit_text(end):
+            nonlocal cursor
+            fragment = text[cursor:end].strip(' ')
+            if fragment:
+                piece.append(' ' + fragment if piece else fragment)
+            cursor = end
+
+        def end_sentence():
+            if piece:
+                sentence = ''.join(piece)
+                output.append(sentence[0].upper() + sentence[1:])
+                piece.clear()
+
+        def emit_mark(mark):
+            if mark == ',':
+                piece.append(' ,' if piece and piece[-1].endswith(',') else ',')
+                return
+            end_sentence()
+            output.append(mark)
+
+        def starts_conjunction(index, position):
+            """Whether token `index` is a conjunction whose leading space is at `position`."""
+            if index >= len(tokens):
+                return False
+            kind, start, _ = tokens[index]
+            return start == position and (
+                kind == 'conjunction' or (kind == 'phrase' and text.startswith(' for ', start)))
+
+        def adverb_takes_comma(index):
+            # ...unless a conjunction right after it claims the shared space first
+            _, _, end = tokens[index]
+            return not starts_conjunction(index + 1, end)
+
+        in_question = False
+        conjunction_end = adverb_end = phrase_end = -1
+        for index, (kind, start, end) in enumerate(tokens):
+            if kind == 'question':
+                in_question = True
+                continue
+            if kind == 'mark' or kind == 'sentence_break':
+                emit_text(start)
+                mark = '.' if kind == 'sentence_break' else text[start]
+                if in_question and mark != ',':
+                    emit_mark('?')
+                    in_question = False
+                emit_mark(mark)
+                cursor = end if kind == 'mark' else start
+                continue
+
+            # A comma rule cannot fire on a word whose leading space the same rule just used up
+            commas = 0
+            if starts_conjunction(index, start) and conjunction_end != start:
+                commas += 1
+                conjunction_end = start + 4 if kind == 'phrase' else end
+            if kind == 'adverb' and adverb_end != start and adverb_takes_comma(index):
+                commas += 1
+                adverb_end = end
+            if kind == 'phrase' and phrase_end != start and not starts_conjunction(index + 1, end) and not (
+                    index + 1 < len(tokens) and tokens[index + 1][0] == 'adverb'
+                    and tokens[index + 1][1] == end and adverb_takes_comma(index + 1)):
+                commas += 1
+                phrase_end = end
+            if commas:
+                emit_text(start)
+                for _ in range(commas):
+                    emit_mark(',')
+
+        emit_text(len(text))
+        if in_question:
+            emit_mark('?')
+        end_sentence()
+        return ' '.join(output)
+
+PUNCTUATOR = os.environ.get('PUNCTUATOR', 'heuristic')
+PUNCTUATION_MODEL_DIR = os.environ.get('PUNCTUATION_MODEL_DIR', 'punctuation_model')
+PUNCTUATION_BUDGET_MS = float(os.environ.get('PUNCTUATION_BUDGET_MS', 50))
+
+class BudgetedPunctuator:
+    """Runs the statistical punctuation model within a per-call latency budget.
+
+    Calls that run out of budget (or fail) are answered by the heuristic engine instead.
+    """
+
+    def __init__(self, model, fallback, budget_seconds):
+        self.model = model
+        self.fallback = fallback
+        self.budget_seconds = budget_seconds
+        self.counters = {"model": 0, "over_budget": 0, "errors": 0}
+        self.lock = threading.Lock()
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def punctuate(self, text):
+        """Return (punctuated text, whether the model produced it rather than the fallback)."""
+        try:
+            result = self.model.add_punctuation(text, deadline=time.monotonic() + self.budget_seconds)
+        except TimeoutError:
+            self._count("over_budget")
+            return self.fallback.add_punctuation(text), False
+        except Exception as e:
+            print(f"Error in punctuation model: {str(e)}")
+            self._count("errors")
+            return self.fallback.add_punctuation(text), False
+        self._count("model")
+        return result, True
+
+    def add_punctuation(self, text):
+        return self.punctuate(text)[0]
+
+    def stats(self):
+        with self.lock:
+            return {"engine": "ngram", "budget_ms": self.budget_seconds * 1000, **self.counters}
+
+def load_punctuator():
+    heuristic = SimplePunctuator()
+    if PUNCTUATOR != 'ngram':
+        return heuristic
+    try:
+        from punctuation_model import NgramPunctuator
+        model = NgramPunctuator(PUNCTUATION_MODEL_DIR)
+    except Exception as e:
+        print(f"Could not load punctuation model from {PUNCTUATION_MODEL_DIR}: {str(e)}; using heuristic punctuation")
+        return heuristic
+    return BudgetedPunctuator(model, heuristic, PUNCTUATION_BUDGET_MS / 1000)
 
 # Initialize punctuator
-punctuator = SimplePunctuator()
+punctuator = load_punctuator()
+
+CACHE_DIR = os.environ.get('CACHE_DIR', 'cache')
+
+class TieredCache:
+    """Bytes cache with an in-memory LRU tier in front of a size-bounded on-disk tier."""
+
+    def __init__(self, directory, max_memory_entries, max_disk_bytes, ttl_seconds=None):
+        self.directory = directory
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.memory = OrderedDict()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.disk_bytes = sum(os.path.getsize(path) for path in self._disk_files())
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _disk_files(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.tmp'):
+                    yield os.path.join(root, name)
+
+    def _expired(self, stored_at):
+        return self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds
+
+    def _remember(self, key, stored_at, value):
+        self.memory[key] = (stored_at, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self.memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return entry[1]
+                del self.memory[key]
+
+        path = self._path(key)
+        try:
+            stored_at = os.path.getmtime(path)
+            if self._expired(stored_at):
+                self._remove(path)
+                raise FileNotFoundError(path)
+            with open(path, 'rb') as f:
+                value = f.read()
+            # atime drives disk LRU eviction; mtime stays the time the entry was stored
+            os.utime(path, (time.time(), stored_at))
+        except OSError:
+            with self.lock:
+                self.counters["misses"] += 1
+            return None
+
+        with self.lock:
+            self.counters["disk_hits"] += 1
+            self._remember(key, stored_at, value)
+        return value
+
+    def set(self, key, value):
+        stored_at = time.time()
+        with self.lock:
+            self._remember(key, stored_at, value)
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(tmp_path, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing cache entry {key}: {str(e)}")
+            return
+        with self.lock:
+            self.disk_bytes += len(value) - previous_size
+            over_budget = self.disk_bytes > self.max_disk_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self.lock:
+            self.disk_bytes -= size
+
+    def _evict_disk(self):
+        """Delete least-recently-read files until the disk tier is back under 90% of its budget."""
+        files = []
+        for path in self._disk_files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_atime, path))
+        files.sort()
+        for _, path in files:
+            if self.disk_bytes <= self.max_disk_bytes * 0.9:
+                break
+            self._remove(path)
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "memory_entries": len(self.memory), "disk_bytes": self.disk_bytes}
+
+class TTSEngine:
+    """Base class for speech synthesis backends; subclasses register themselves with @register_tts_engine."""
+
+    name = None
+    mimetype = 'audio/mpeg'
+    capabilities = {
+        "offline": False,   # Works without network access
+        "slow": False,      # Honours the slow flag
+        "accents": False,   # Honours tld (regional accent)
+        "voices": False     # Honours the voice ('male'/'female') selection
+    }
+
+    def synthesize(self, text, language='en', slow=False, tld='com', voice=None):
+        """Return the encoded audio bytes for the text."""
+        raise NotImplementedError
+
+TTS_ENGINES = {}
+
+def register_tts_engine(engine_class):
+    TTS_ENGINES[engine_class.name] = engine_class
+    return engine_class
+
+@register_tts_engine
+class GTTSEngine(TTSEngine):
+    name = 'gtts'
+    capabilities = {"offline": False, "slow": True, "accents": True, "voices": False}
+
+    def synthesize(self, text, language='en', slow=False, tld='com', voice=None):
+        tts = gTTS(text=text, lang=language, slow=slow, tld=tld)
+        audio_buffer = io.BytesIO()
+        tts.write_to_fp(audio_buffer)
+        return audio_buffer.getvalue()
+
+@register_tts_engine
+class CoquiEngine(TTSEngine):
+    name = 'coqui'
+    mimetype = 'audio/wav'
+    capabilities = {"offline": True, "slow": False, "accents": False, "voices": False}
+
+    def __init__(self):
+        # Imported here so deployments that only use gTTS do not need torch installed
+        import torch
+        from TTS.api import TTS
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.model = TTS(os.environ.get('COQUI_MODEL', 'tts_models/en/ljspeech/tacotron2-DDC')).to(device)
+        self.lock = threading.Lock()
+
+    def synthesize(self, text, language='en', slow=False, tld='com', voice=None):
+        audio_buffer = io.BytesIO()
+        with self.lock:
+            wav = self.model.tts(text=text)
+            self.model.synthesizer.save_wav(wav, audio_buffer)
+        return audio_buffer.getvalue()
+
+# Scratch files for engines that can only write to a file; RAM-backed where the OS has it, so no disk I/O
+AUDIO_SCRATCH_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+@register_tts_engine
+class Pyttsx3Engine(TTSEngine):
+    name = 'pyttsx3'
+    mimetype = 'audio/wav'
+    capabilities = {"offline": True, "slow": True, "accents": False, "voices": True}
+
+    def __init__(self):
+        # pyttsx3 drivers (SAPI5's COM objects in particular) belong to the thread that created them, so one
+        # dedicated thread creates the engine and runs every synthesis; the TTS workers only wait on it
+        self.thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pyttsx3')
+        try:
+            self.voices = self.thread.submit(self._init_engine).result()
+        except Exception:
+            self.thread.shutdown(wait=False)
+            raise
+
+    def _init_engine(self):
+        import pyttsx3
+        self.engine = pyttsx3.init()
+        self.engine.setProperty('volume', 0.8)
+        voices = self.engine.getProperty('voices')
+        return {
+            'female': next((v.id for v in voices if 'female' in v.name.lower()), None),
+            'male': next((v.id for v in voices if 'male' in v.name.lower() and 'female' not in v.name.lower()), None)
+        }
+
+    def synthesize(self, text, language='en', slow=False, tld='com', voice=None):
+        return self.thread.submit(self._synthesize, text, slow, voice).result()
+
+    def _synthesize(self, text, slow, voice):
+        path = os.path.join(AUDIO_SCRATCH_DIR, f"ielts-tts-{uuid.uuid4().hex}.wav")
+        try:
+            self.engine.setProperty('rate', 120 if slow else 150)
+            voice_id = self.voices.get(voice) or self.voices['male']
+            if voice_id:
+                self.engine.setProperty('voice', voice_id)
+            self.engine.save_to_file(text, path)
+            self.engine.runAndWait()
+            with open(path, 'rb') as audio_file:
+                return audio_file.read()
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+@register_tts_engine
+class StubEngine(TTSEngine):
+    """Offline engine that returns silence sized to the text, for tests and development."""
+
+    name = 'stub'
+    mimetype = 'audio/wav'
+    capabilities = {"offline": True, "slow": True, "accents": False, "voices": False}
+    sample_rate = 16000
+
+    def synthesize(self, text, language='en', slow=False, tld='com', voice=None):
+        seconds = min(30.0, 0.06 * len(text) * (1.5 if slow else 1.0))
+        audio_buffer = io.BytesIO()
+        with wave.open(audio_buffer, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(self.sample_rate)
+            wav_file.writeframes(b'\x00\x00' * int(seconds * self.sample_rate))
+        return audio_buffer.getvalue()
+
+# Primary engine, then fallbacks tried in order when it fails or cannot be loaded
+TTS_ENGINE = os.environ.get('TTS_ENGINE', 'gtts')
+TTS_FALLBACK_ENGINES = [e.strip() for e in os.environ.get('TTS_FALLBACK_ENGINES', 'gtts').split(',') if e.strip()]
+
+tts_engines = {}
+tts_engine_load_errors = {}
+tts_engines_lock = threading.Lock()
+
+def get_tts_engine(name):
+    """Return the shared instance of a registered engine, creating it on first use.
+
+    An engine that fails to load (e.g. missing dependency) is not retried on every request.
+    """
+    with tts_engines_lock:
+        if name in tts_engine_load_errors:
+            raise tts_engine_load_errors[name]
+        if name not in tts_engines:
+            if name not in TTS_ENGINES:
+                raise ValueError(f"Unknown TTS engine: {name}")
+            try:
+                tts_engines[name] = TTS_ENGINES[name]()
+            except Exception as e:
+                tts_engine_load_errors[name] = e
+                raise
+        return tts_engines[name]
+
+TTS_CACHE_MAX_ENTRIES = int(os.environ.get('TTS_CACHE_MAX_ENTRIES', 256))
+TTS_CACHE_DISK_BYTES = int(os.environ.get('TTS_CACHE_DISK_BYTES', 512 * 1024 * 1024))
+
+tts_cache = TieredCache(os.path.join(CACHE_DIR, 'tts'), TTS_CACHE_MAX_ENTRIES, TTS_CACHE_DISK_BYTES)
+
+FFMPEG_PATH = os.environ.get('FFMPEG_PATH') or shutil.which('ffmpeg')
+TTS_DEFAULT_CODEC = os.environ.get('TTS_DEFAULT_CODEC', 'original')
+TTS_ENCODE_TIMEOUT_SECONDS = float(os.environ.get('TTS_ENCODE_TIMEOUT_SECONDS', 30))
+BITRATE_PATTERN = re.compile(r'^\d{1,3}k$')
+
+if FFMPEG_PATH is None:
+    print("ffmpeg not found; TTS audio will be served unencoded")
+
+# Speech-tuned output formats: mono, voice-band sample rates and low bitrates
+AUDIO_CODECS = {
+    'opus': {
+        'mimetype': 'audio/ogg',
+        'bitrate': '24k',
+        'args': ['-ac', '1', '-ar', '24000', '-c:a', 'libopus', '-application', 'voip', '-f', 'ogg']
+    },
+    'mp3': {
+        'mimetype': 'audio/mpeg',
+        'bitrate': '32k',
+        'args': ['-ac', '1', '-ar', '22050', '-c:a', 'libmp3lame', '-f', 'mp3']
+    }
+}
+
+def encode_audio(audio, mimetype, codec, bitrate=None):
+    """Re-encode audio with ffmpeg; returns (audio, mimetype), unchanged if no encoding is needed or possible."""
+    spec = AUDIO_CODECS.get(codec)
+    if spec is None:
+        return audio, mimetype
+    # gTTS already emits low-bitrate MP3, so only re-encode it when a bitrate is asked for explicitly
+    if spec['mimetype'] == mimetype and bitrate is None:
+        return audio, mimetype
+    if FFMPEG_PATH is None:
+        return audio, mimetype
+    try:
+        result = subprocess.run(
+            [FFMPEG_PATH, '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0', '-vn',
+             *spec['args'], '-b:a', bitrate or spec['bitrate'], 'pipe:1'],
+            input=audio,
+            capture_output=True,
+            timeout=TTS_ENCODE_TIMEOUT_SECONDS
+        )
+    except (subprocess.TimeoutExpired, OSError) as e:
+        # A missing, broken or hung ffmpeg must not take TTS down with it; serve the engine's audio instead
+        print(f"Error encoding TTS audio as {codec}: {str(e)}")
+        return audio, mimetype
+    if result.returncode != 0 or not result.stdout:
+        print(f"Error encoding TTS audio as {codec}: {result.stderr.decode('utf-8', 'replace').strip()}")
+        return audio, mimetype
+    return result.stdout, spec['mimetype']
+
+def synthesize_speech(text, language='en', slow=False, tld='com', voice=None, codec=None, bitrate=None):
+    """Return (audio bytes, mimetype) for the text from the configured engine chain, via the TTS cache.
+
+    With a codec, the encoded artifact is cached alongside the engine output so repeat requests skip both steps.
+    """
+    last_error = None
+    for name in dict.fromkeys([TTS_ENGINE] + TTS_FALLBACK_ENGINES):
+        key = TieredCache.make_key(name, text, language, bool(slow), tld, voice)
+        encoded_key = TieredCache.make_key(key, codec, bitrate) if codec in AUDIO_CODECS else None
+        if encoded_key:
+            encoded = tts_cache.get(encoded_key)
+            if encoded is not None:
+                return encoded, AUDIO_CODECS[codec]['mimetype']
+        audio = tts_cache.get(key)
+        if audio is None:
+            try:
+                audio = get_tts_engine(name).synthesize(text, language, slow, tld, voice)
+            except Exception as e:
+                print(f"TTS engine {name} failed: {str(e)}")
+                last_error = e
+                continue
+            tts_cache.set(key, audio)
+        mimetype = TTS_ENGINES[name].mimetype
+        if encoded_key:
+            encoded, mimetype = encode_audio(audio, mimetype, codec, bitrate)
+            # Audio already in the requested format comes back as is and is cached under `key` already
+            if encoded is not audio and mimetype == AUDIO_CODECS[codec]['mimetype']:
+                tts_cache.set(encoded_key, encoded)
+            audio = encoded
+        return audio, mimetype
+    raise last_error
+
+TTS_WORKERS = int(os.environ.get('TTS_WORKERS', 4))
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+tts_executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix='tts')
+
+def split_sentences(text):
+    return [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+class SentenceBuffer:
+    """Collects streamed text and hands back each sentence once it is complete."""
+
+    def __init__(self):
+        self.buffer = ''
+
+    def feed(self, token):
+        self.buffer += token
+        *complete, self.buffer = SENTENCE_BOUNDARY.split(self.buffer)
+        return [sentence.strip() for sentence in complete if sentence.strip()]
+
+    def flush(self):
+        rest, self.buffer = self.buffer.strip(), ''
+        return [rest] if rest else []
+
+def submit_sentences(text, language='en', slow=False, tld='com', voice=None, codec=None, bitrate=None):
+    """Start synthesizing every sentence concurrently; returns [(sentence, future)] in order."""
+    return [
+        (sentence, tts_executor.submit(synthesize_speech, sentence, language, slow, tld, voice, codec, bitrate))
+        for sentence in split_sentences(text)
+    ]
+
+def synthesize_sentences(text, **options):
+    """Synthesize every sentence concurrently and yield (sentence, (audio, mimetype)) in order as they finish."""
+    pending = submit_sentences(text, **options)
+    try:
+        for sentence, future in pending:
+            yield sentence, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get('OLLAMA_CONNECT_TIMEOUT', 3.05))
+OLLAMA_READ_TIMEOUT = float(os.environ.get('OLLAMA_READ_TIMEOUT', 120))
+OLLAMA_POOL_SIZE = int(os.environ.get('OLLAMA_POOL_SIZE', 16))
+OLLAMA_MAX_RETRIES = int(os.environ.get('OLLAMA_MAX_RETRIES', 2))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', 5))
+BREAKER_RESET_SECONDS = float(os.environ.get('BREAKER_RESET_SECONDS', 30))
+
+class CircuitOpenError(Exception):
+    """Raised when an upstream endpoint's circuit breaker is open."""
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half-open"
+
+    def allow(self):
+        """Return True if a request may be sent; only one trial request passes while half-open."""
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Let the next half-open trial through after one ended with neither a success nor a failure."""
+        with self.lock:
+            self.trial_in_flight = False
+
+class UpstreamClient:
+    """Keep-alive HTTP sessions and circuit breakers, one per upstream endpoint."""
+
+    def __init__(self):
+        self.sessions = {}
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def _new_session(self):
+        # Connect errors are retried for any method since the request never reached the server;
+        # read and status retries are limited to idempotent methods.
+        retry = Retry(
+            total=OLLAMA_MAX_RETRIES,
+            connect=OLLAMA_MAX_RETRIES,
+            read=OLLAMA_MAX_RETRIES,
+            status=OLLAMA_MAX_RETRIES,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            status_forcelist=(502, 503, 504),
+            backoff_factor=0.2,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=OLLAMA_POOL_SIZE, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _get(self, endpoint):
+        with self.lock:
+            if endpoint not in self.sessions:
+                self.sessions[endpoint] = self._new_session()
+                self.breakers[endpoint] = CircuitBreaker()
+            return self.sessions[endpoint], self.breakers[endpoint]
+
+    def request(self, method, endpoint, path, timeout=None, **kwargs):
+        session, breaker = self._get(endpoint)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Upstream {endpoint} is unavailable (circuit open)")
+        try:
+            response = session.request(
+                method,
+                f"{endpoint}{path}",
+                timeout=timeout or (OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT),
+                **kwargs
+            )
+        except requests.RequestException:
+            # Includes errors reading the body (ChunkedEncodingError, ContentDecodingError) when Ollama dies mid-reply
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.release_trial()
+            raise
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    def post(self, endpoint, path, **kwargs):
+        return self.request('POST', endpoint, path, **kwargs)
+
+    def get(self, endpoint, path, **kwargs):
+        return self.request('GET', endpoint, path, **kwargs)
+
+    def status(self):
+        with self.lock:
+            return {endpoint: breaker.state for endpoint, breaker in self.breakers.items()}
+
+upstream = UpstreamClient()
+
+DEFAULT_OLLAMA_ENDPOINT = os.environ.get('OLLAMA_ENDPOINT', 'http://localhost:11434')
+CONVERSATION_MODEL = os.environ.get('CONVERSATION_MODEL', 'gemma3:12b')
+SCORING_MODEL = os.environ.get('SCORING_MODEL', 'gemma3:12b')
+OLLAMA_KEEP_ALIVE = os.environ.get('OLLAMA_KEEP_ALIVE', '30m')
+KEEPALIVE_INTERVAL_SECONDS = float(os.environ.get('KEEPALIVE_INTERVAL_SECONDS', 240))
+# A request whose model load took longer than this is counted as a cold start
+COLD_LOAD_THRESHOLD_SECONDS = float(os.environ.get('COLD_LOAD_THRESHOLD_SECONDS', 1.0))
+
+class ModelWarmer:
+    """Preloads models on their Ollama endpoints, keeps them resident and records cold/warm latency."""
+
+    def __init__(self, models):
+        self.states = {}
+        self.latency = {
+            "cold": {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0},
+            "warm": {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+        }
+        self.lock = threading.Lock()
+        self.thread = None
+        for endpoint, model in models:
+            self.track(endpoint, model)
+
+    def track(self, endpoint, model):
+        with self.lock:
+            self.states.setdefault((endpoint, model), {"state": "cold", "load_seconds": None, "last_ping": None})
+
+    def warm(self, endpoint, model):
+        """Load a model (or refresh its keep-alive) with an empty generate request."""
+        self.track(endpoint, model)
+        with self.lock:
+            if self.states[(endpoint, model)]["state"] == "cold":
+                self.states[(endpoint, model)]["state"] = "warming"
+        try:
+            response = upstream.post(
+                endpoint,
+                "/api/generate",
+                json={"model": model, "prompt": "", "keep_alive": OLLAMA_KEEP_ALIVE, "stream": False}
+            )
+            response.raise_for_status()
+            load_seconds = response.json().get("load_duration", 0) / 1e9
+        except Exception as e:
+            print(f"Error warming {model} on {endpoint}: {str(e)}")
+            with self.lock:
+                self.states[(endpoint, model)]["state"] = "cold"
+            return False
+        with self.lock:
+            state = self.states[(endpoint, model)]
+            state["state"] = "warm"
+            state["last_ping"] = time.time()
+            if load_seconds > COLD_LOAD_THRESHOLD_SECONDS:
+                state["load_seconds"] = round(load_seconds, 3)
+        return True
+
+    def record(self, endpoint, model, elapsed_seconds, load_seconds):
+        """Record the latency of a chat call, classified by whether it had to load the model.
+
+        Only the configured endpoint/model pairs are recorded; pairs named by clients are never tracked, so
+        they are not kept warm and cannot hold up readiness.
+        """
+        kind = "cold" if load_seconds > COLD_LOAD_THRESHOLD_SECONDS else "warm"
+        with self.lock:
+            if (endpoint, model) not in self.states:
+                return
+            stats = self.latency[kind]
+            stats["count"] += 1
+            stats["total_seconds"] += elapsed_seconds
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed_seconds)
+            self.states[(endpoint, model)]["state"] = "warm"
+            if kind == "cold":
+                self.states[(endpoint, model)]["load_seconds"] = round(load_seconds, 3)
+
+    def _run(self):
+        while True:
+            with self.lock:
+                keys = list(self.states)
+            for endpoint, model in keys:
+                self.warm(endpoint, model)
+            time.sleep(KEEPALIVE_INTERVAL_SECONDS)
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="model-warmer", daemon=True)
+                self.thread.start()
+
+    def ready(self, serves=None):
+        """True once every model is warm on at least one endpoint that serves(endpoint, model) allows."""
+        with self.lock:
+            warm = {key: state["state"] == "warm" for key, state in self.states.items()}
+        models = {model for _, model in warm}
+        return all(
+            any(is_warm and (serves is None or serves(endpoint, model))
+                for (endpoint, warm_model), is_warm in warm.items() if warm_model == model)
+            for model in models
+        )
+
+    def status(self):
+        with self.lock:
+            models = [
+                {"endpoint": endpoint, "model": model, **state}
+                for (endpoint, model), state in self.states.items()
+            ]
+            latency = {
+                kind: {
+                    "count": stats["count"],
+                    "avg_seconds": round(stats["total_seconds"] / stats["count"], 3) if stats["count"] else None,
+                    "max_seconds": round(stats["max_seconds"], 3)
+                }
+                for kind, stats in self.latency.items()
+            }
+        return {"models": models, "latency": latency}
+
+# Comma-separated Ollama base URLs; when set, the server schedules requests across them and
+# ignores the endpoint sent by the client
+OLLAMA_BACKENDS = [b.strip().rstrip('/') for b in os.environ.get('OLLAMA_BACKENDS', '').split(',') if b.strip()]
+HEALTH_CHECK_INTERVAL_SECONDS = float(os.environ.get('HEALTH_CHECK_INTERVAL_SECONDS', 10))
+BACKEND_EJECT_AFTER_FAILURES = int(os.environ.get('BACKEND_EJECT_AFTER_FAILURES', 3))
+
+model_warmer = ModelWarmer({
+    (endpoint, model)
+    for endpoint in (OLLAMA_BACKENDS or [DEFAULT_OLLAMA_ENDPOINT])
+    for model in (CONVERSATION_MODEL, SCORING_MODEL)
+})
+
+class NoBackendAvailableError(Exception):
+    """Raised when no healthy Ollama backend can serve the requested model."""
+
+class BackendPool:
+    """Least-outstanding-requests scheduling over several Ollama servers, with health checks."""
+
+    def __init__(self, endpoints):
+        self.backends = {
+            endpoint: {
+                "healthy": True,
+                "in_flight": 0,
+                "served": 0,
+                "failures": 0,
+                "installed": None,  # None until the first health check has listed the models
+                "loaded": set()
+            }
+            for endpoint in endpoints
+        }
+        self.lock = threading.Lock()
+        self.thread = None
 
-def generate_speech(text, language='en', slow=False, tld='com'):
-    """Generate speech using gTTS and return the audio data as base64."""
-    tts = gTTS(text=text, lang=language, slow=slow, tld=tld)
-    audio_buffer = io.BytesIO()
-    tts.write_to_fp(audio_buffer)
-    audio_buffer.seek(0)
-    audio_data = base64.b64encode(audio_buffer.read()).decode('utf-8')
-    return audio_data
+    @staticmethod
+    def _can_serve(backend, model):
+        return backend["healthy"] and (backend["installed"] is None or model in backend["installed"])
+
+    def _pick(self, model):
+        candidates = [
+            (endpoint, backend) for endpoint, backend in self.backends.items() if self._can_serve(backend, model)
+        ]
+        if not candidates:
+            raise NoBackendAvailableError(f"No healthy Ollama backend has {model}")
+        # Fewest in-flight requests first; among equals prefer a backend with the model already loaded
+        endpoint, backend = min(
+            candidates,
+            key=lambda item: (item[1]["in_flight"], model not in item[1]["loaded"], item[1]["served"])
+        )
+        backend["in_flight"] += 1
+        backend["served"] += 1
+        return endpoint, backend
+
+    @contextmanager
+    def acquire(self, model, fallback_endpoint):
+        """Yield the endpoint to use for one request, counting it as in flight until the block exits."""
+        endpoint = self.checkout(model, fallback_endpoint)
+        try:
+            yield endpoint
+        except (requests.ConnectionError, requests.Timeout, CircuitOpenError):
+            self.checkin(endpoint, model, succeeded=False, unreachable=True)
+            raise
+        except BaseException:
+            self.checkin(endpoint, model, succeeded=False)
+            raise
+        self.checkin(endpoint, model)
+
+    def checkout(self, model, fallback_endpoint):
+        """Return the endpoint for one request and count it as in flight until checkin()."""
+        if not self.backends:
+            return fallback_endpoint
+        with self.lock:
+            endpoint, _ = self._pick(model)
+        return endpoint
+
+    def checkin(self, endpoint, model, succeeded=True, unreachable=False):
+        """Finish a request started with checkout(); unreachable backends count towards ejection."""
+        if endpoint not in self.backends:
+            return
+        if unreachable:
+            self._record_failure(endpoint)
+        with self.lock:
+            backend = self.backends[endpoint]
+            backend["in_flight"] -= 1
+            if succeeded:
+                backend["loaded"].add(model)
+
+    def serves(self, endpoint, model):
+        """True if the endpoint is healthy and has the model installed (or has not been checked yet)."""
+        if endpoint not in self.backends:
+            return True
+        with self.lock:
+            return self._can_serve(self.backends[endpoint], model)
+
+    def _record_failure(self, endpoint):
+        with self.lock:
+            backend = self.backends[endpoint]
+            backend["failures"] += 1
+            if backend["healthy"] and backend["failures"] >= BACKEND_EJECT_AFTER_FAILURES:
+                backend["healthy"] = False
+                print(f"Ejecting Ollama backend {endpoint} after {backend['failures']} failures")
+
+    def check(self, endpoint):
+        """Probe a backend's installed and loaded models; ejects or readmits it based on the result."""
+        timeout = (OLLAMA_CONNECT_TIMEOUT, 5)
+        try:
+            tags = upstream.get(endpoint, "/api/tags", timeout=timeout)
+            tags.raise_for_status()
+            ps = upstream.get(endpoint, "/api/ps", timeout=timeout)
+            loaded = {m["name"] for m in ps.json().get("models", [])} if ps.status_code == 200 else set()
+            installed = {m["name"] for m in tags.json().get("models", [])}
+        except Exception as e:
+            print(f"Health check failed for {endpoint}: {str(e)}")
+            self._record_failure(endpoint)
+            return False
+        with self.lock:
+            backend = self.backends[endpoint]
+            if not backend["healthy"]:
+                print(f"Readmitting Ollama backend {endpoint}")
+            backend.update(healthy=True, failures=0, installed=installed, loaded=loaded)
+        return True
+
+    def _run(self):
+        while True:
+            for endpoint in list(self.backends):
+                self.check(endpoint)
+            time.sleep(HEALTH_CHECK_INTERVAL_SECONDS)
+
+    def start(self):
+        with self.lock:
+            if self.backends and self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="backend-health", daemon=True)
+                self.thread.start()
+
+    def status(self):
+        with self.lock:
+            return [
+                {
+                    "endpoint": endpoint,
+                    "healthy": backend["healthy"],
+                    "in_flight": backend["in_flight"],
+                    "served": backend["served"],
+                    "failures": backend["failures"],
+                    "loaded_models": sorted(backend["loaded"])
+                }
+                for endpoint, backend in self.backends.items()
+            ]
+
+backend_pool = BackendPool(OLLAMA_BACKENDS)
 
 def handle_ollama_api(model, messages, endpoint):
     """Call the Ollama API and return the response data."""
-    ollama_response = requests.post(
-        f"{endpoint}/api/chat",
+    started = time.monotonic()
+    ollama_response = upstream.post(
+        endpoint,
+        "/api/chat",
         json={
             "model": model,
             "messages": messages,
-            "stream": False
+            "stream": False,
+            "keep_alive": OLLAMA_KEEP_ALIVE
         }
     )
     if ollama_response.status_code != 200:
         return None, f"Ollama API returned status code {ollama_response.status_code}"
-    return ollama_response.json(), None
+    response_data = ollama_response.json()
+    model_warmer.record(endpoint, model, time.monotonic() - started, response_data.get("load_duration", 0) / 1e9)
+    return response_data, None
+
+def stream_ollama_api(model, messages, endpoint):
+    """Call the Ollama API in streaming mode and yield content tokens as they arrive."""
+    started = time.monotonic()
+    ollama_response = upstream.post(
+        endpoint,
+        "/api/chat",
+        json={
+            "model": model,
+            "messages": messages,
+            "stream": True,
+            "keep_alive": OLLAMA_KEEP_ALIVE
+        },
+        stream=True
+    )
+    try:
+        if ollama_response.status_code != 200:
+            raise RuntimeError(f"Ollama API returned status code {ollama_response.status_code}")
+        for line in ollama_response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise RuntimeError(chunk["error"])
+            token = chunk.get("message", {}).get("content", "")
+            if token:
+                yield token
+            if chunk.get("done"):
+                model_warmer.record(endpoint, model, time.monotonic() - started, chunk.get("load_duration", 0) / 1e9)
+                break
+        else:
+            # A reply cut off without its done chunk must not be cached or recorded as complete
+            raise RuntimeError("Ollama stream ended before the reply was done")
+    finally:
+        ollama_response.close()
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 512))
+RESPONSE_CACHE_DISK_BYTES = int(os.environ.get('RESPONSE_CACHE_DISK_BYTES', 64 * 1024 * 1024))
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', 24 * 3600))
+
+response_cache = TieredCache(
+    os.path.join(CACHE_DIR, 'responses'),
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_DISK_BYTES,
+    RESPONSE_CACHE_TTL_SECONDS
+)
+
+# Concurrent requests admitted per model for each backend; the rest wait in a priority queue
+MODEL_CONCURRENCY = int(os.environ.get('MODEL_CONCURRENCY', 2))
+QUEUE_LATENCY_BUDGET_SECONDS = float(os.environ.get('QUEUE_LATENCY_BUDGET_SECONDS', 20))
+PRIORITY_INTERACTIVE = 0
+PRIORITY_SCORING = 1
+PRIORITIES = {"interactive": PRIORITY_INTERACTIVE, "scoring": PRIORITY_SCORING}
+
+class AdmissionRejectedError(Exception):
+    """Raised when a request's estimated queue wait exceeds the latency budget."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Per-model concurrency limits with a priority queue in front of Ollama."""
+
+    def __init__(self, concurrency, budget_seconds):
+        self.concurrency = concurrency
+        self.budget_seconds = budget_seconds
+        self.models = {}
+        self.sequence = itertools.count()
+        self.queue_stats = {
+            name: {"admitted": 0, "rejected": 0, "total_wait_seconds": 0.0, "max_wait_seconds": 0.0}
+            for name in PRIORITIES
+        }
+        self.lock = threading.Lock()
+
+    def _model(self, model):
+        # Service time starts at a pessimistic guess and is refined by an exponential moving average
+        return self.models.setdefault(model, {"active": 0, "waiting": [], "service_seconds": 5.0})
+
+    def _record_wait(self, priority, waited):
+        name = next(name for name, value in PRIORITIES.items() if value == priority)
+        stats = self.queue_stats[name]
+        stats["admitted"] += 1
+        stats["total_wait_seconds"] += waited
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+
+    @contextmanager
+    def acquire(self, model, priority=PRIORITY_INTERACTIVE):
+        """Hold one of the model's concurrency slots for the duration of the block."""
+        slot = self.admit(model, priority)
+        try:
+            yield
+        finally:
+            self.release(slot)
+
+    def admit(self, model, priority=PRIORITY_INTERACTIVE):
+        """Take one of the model's concurrency slots, queueing for it if needed; pass the result to release()."""
+        ticket = self.enqueue(model, priority, threading.Event())
+        ticket["granted"].wait(OLLAMA_READ_TIMEOUT)
+        return self.claim(ticket)
+
+    def enqueue(self, model, priority, granted):
+        """Take a free slot or join the queue for one, without blocking; returns a ticket for claim() or withdraw().
+
+        granted is a threading.Event or anything with the same set()/is_set(); it is set (possibly from
+        another thread) once the slot is ours.
+        """
+        enqueued = time.monotonic()
+        with self.lock:
+            state = self._model(model)
+            if state["active"] < self.concurrency and not state["waiting"]:
+                state["active"] += 1
+                granted.set()
+            else:
+                ahead = sum(1 for entry in state["waiting"] if entry[0] <= priority)
+                estimated_wait = (ahead + 1) * state["service_seconds"] / self.concurrency
+                if estimated_wait > self.budget_seconds:
+                    name = next(name for name, value in PRIORITIES.items() if value == priority)
+                    self.queue_stats[name]["rejected"] += 1
+                    raise AdmissionRejectedError(
+                        f"{model} is busy; estimated wait {estimated_wait:.1f}s exceeds the latency budget",
+                        retry_after=math.ceil(estimated_wait - self.budget_seconds) + 1
+                    )
+                heapq.heappush(state["waiting"], [priority, next(self.sequence), granted])
+        return {"model": model, "priority": priority, "state": state, "granted": granted, "enqueued": enqueued}
+
+    def claim(self, ticket):
+        """Return the slot for an enqueued ticket, or leave the queue and raise if it has not been granted."""
+        with self.lock:
+            if not ticket["granted"].is_set():
+                self._leave_queue(ticket)
+                raise AdmissionRejectedError(f"Timed out waiting for {ticket['model']}", retry_after=5)
+            started = time.monotonic()
+            self._record_wait(ticket["priority"], started - ticket["enqueued"])
+        return ticket["state"], started
+
+    def withdraw(self, ticket):
+        """Give up an enqueued ticket whose request has gone away, handing back its slot if it was granted."""
+        with self.lock:
+            if ticket["granted"].is_set():
+                self._hand_off(ticket["state"])
+            else:
+                self._leave_queue(ticket)
+
+    def _leave_queue(self, ticket):
+        waiting = ticket["state"]["waiting"]
+        waiting[:] = [waiter for waiter in waiting if waiter[2] is not ticket["granted"]]
+        heapq.heapify(waiting)
+
+    def _hand_off(self, state):
+        if state["waiting"]:
+            # Hand the slot straight to the highest-priority waiter
+            heapq.heappop(state["waiting"])[2].set()
+        else:
+            state["active"] -= 1
+
+    def release(self, slot):
+        state, started = slot
+        with self.lock:
+            state["service_seconds"] = 0.8 * state["service_seconds"] + 0.2 * (time.monotonic() - started)
+            self._hand_off(state)
+
+    def stats(self):
+        with self.lock:
+            queues = {
+                name: {
+                    "admitted": stats["admitted"],
+                    "rejected": stats["rejected"],
+                    "avg_wait_seconds": round(stats["total_wait_seconds"] / stats["admitted"], 3) if stats["admitted"] else None,
+                    "max_wait_seconds": round(stats["max_wait_seconds"], 3)
+                }
+                for name, stats in self.queue_stats.items()
+            }
+            models = {
+                model: {
+                    "active": state["active"],
+                    "waiting": len(state["waiting"]),
+                    "service_seconds": round(state["service_seconds"], 3)
+                }
+                for model, state in self.models.items()
+            }
+        return {"queues": queues, "models": models}
+
+admission = AdmissionController(MODEL_CONCURRENCY * max(1, len(OLLAMA_BACKENDS)), QUEUE_LATENCY_BUDGET_SECONDS)
+
+def response_cache_key(model, messages):
+    """Hash the model and messages, ignoring whitespace differences in message content."""
+    normalized = [[m.get('role', ''), ' '.join(str(m.get('content', '')).split())] for m in messages]
+    return TieredCache.make_key(model, normalized)
+
+def lookup_reply(model, messages):
+    """Return the cached reply to this prompt, or None."""
+    cached = response_cache.get(response_cache_key(model, messages))
+    # Empty entries written before empty replies stopped being cached count as misses
+    return (json.loads(cached)["message"]["content"] or None) if cached is not None else None
+
+def store_reply(model, messages, reply):
+    """Cache a reply; empty replies are not cached, so a retry can get a real answer."""
+    if not reply:
+        return
+    message = {"role": "assistant", "content": reply}
+    response_cache.set(response_cache_key(model, messages), json.dumps({"message": message}).encode('utf-8'))
+
+def cached_ollama_api(model, messages, endpoint, use_cache=True, priority=PRIORITY_INTERACTIVE):
+    """handle_ollama_api with a response cache and admission control in front of it."""
+    cached = lookup_reply(model, messages) if use_cache else None
+    if cached is not None:
+        return {"message": {"role": "assistant", "content": cached}}, None
+    with admission.acquire(model, priority), backend_pool.acquire(model, endpoint) as backend_endpoint:
+        response_data, error = handle_ollama_api(model, messages, backend_endpoint)
+    if use_cache and not error:
+        store_reply(model, messages, response_data["message"]["content"])
+    return response_data, error
+
+def cached_stream_ollama_api(model, messages, endpoint, use_cache=True, priority=PRIORITY_INTERACTIVE):
+    """stream_ollama_api with a response cache and admission control in front of it.
+
+    A cache hit is yielded as a single token.
+    """
+    cached = lookup_reply(model, messages) if use_cache else None
+    if cached is not None:
+        yield cached
+        return
+    tokens = []
+    with admission.acquire(model, priority), backend_pool.acquire(model, endpoint) as backend_endpoint:
+        for token in stream_ollama_api(model, messages, backend_endpoint):
+            tokens.append(token)
+            yield token
+    if use_cache:
+        store_reply(model, messages, ''.join(tokens))
+
+HISTORY_TOKEN_BUDGET = int(os.environ.get('HISTORY_TOKEN_BUDGET', 3000))
+HISTORY_KEEP_RECENT_MESSAGES = int(os.environ.get('HISTORY_KEEP_RECENT_MESSAGES', 6))
+# Older turns are collapsed in blocks of this many messages so a summary is reused across turns
+HISTORY_SUMMARY_CHUNK = int(os.environ.get('HISTORY_SUMMARY_CHUNK', 4))
+SUMMARY_MODEL = os.environ.get('SUMMARY_MODEL', CONVERSATION_MODEL)
+SUMMARY_PROMPT = (
+    "Summarize the following part of an IELTS speaking test in a few sentences. Keep the topics and "
+    "questions covered and the candidate's notable answers, so the examiner can continue naturally."
+)
+
+def estimate_tokens(text):
+    """Rough token count for English text (about four characters per token)."""
+    return len(text) // 4 + 1
+
+class HistoryCompactor:
+    """Keeps prompts under a token budget by collapsing older turns into a cached summary.
+
+    Summaries are produced in the background, so a turn never waits for one; until the summary for
+    the newest block is ready the previous summary plus the uncollapsed turns is sent instead.
+    """
+
+    def __init__(self, budget, keep_recent, chunk):
+        self.budget = budget
+        self.keep_recent = keep_recent
+        self.chunk = chunk
+        self.summaries = TieredCache(os.path.join(CACHE_DIR, 'summaries'), 256, 16 * 1024 * 1024)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='summarizer')
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(messages):
+        return TieredCache.make_key('summary', [[m['role'], m['content']] for m in messages])
+
+    def _latest_summary(self, older, cut):
+        """Return (length, summary) for the longest summarized prefix of older[:cut]."""
+        for length in range(cut, 0, -self.chunk):
+            summary = self.summaries.get(self._key(older[:length]))
+            if summary is not None:
+                return length, summary.decode('utf-8')
+        return 0, None
+
+    def _summarize(self, older, cut, endpoint):
+        try:
+            length, summary = self._latest_summary(older, cut)
+            transcript = '\n'.join(f"{m['role']}: {m['content']}" for m in older[length:cut])
+            if summary:
+                transcript = f"Summary so far: {summary}\n\n{transcript}"
+            response_data, error = cached_ollama_api(
+                SUMMARY_MODEL,
+                [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}],
+                endpoint,
+                priority=PRIORITY_SCORING
+            )
+            if error:
+                raise RuntimeError(error)
+            self.summaries.set(self._key(older[:cut]), response_data["message"]["content"].encode('utf-8'))
+        except Exception as e:
+            print(f"Error summarizing conversation history: {str(e)}")
+        finally:
+            with self.lock:
+                self.pending.discard(self._key(older[:cut]))
+
+    def _schedule(self, older, cut, endpoint):
+        key = self._key(older[:cut])
+        with self.lock:
+            if key in self.pending:
+                return
+            self.pending.add(key)
+        self.executor.submit(self._summarize, list(older), cut, endpoint)
+
+    def compact(self, messages, endpoint):
+        if sum(estimate_tokens(m.get('content', '')) for m in messages) <= self.budget:
+            return messages
+        system = [m for m in messages if m.get('role') == 'system']
+        rest = [m for m in messages if m.get('role') != 'system']
+        older, recent = rest[:-self.keep_recent], rest[-self.keep_recent:]
+        cut = len(older) - len(older) % self.chunk
+        if cut == 0:
+            return messages
+
+        length, summary = self._latest_summary(older, cut)
+        if length < cut:
+            self._schedule(older, cut, endpoint)
+        if summary is None:
+            return messages
+        return (
+            system
+            + [{"role": "system", "content": f"Summary of the earlier conversation: {summary}"}]
+            + older[length:]
+            + recent
+        )
+
+history_compactor = HistoryCompactor(HISTORY_TOKEN_BUDGET, HISTORY_KEEP_RECENT_MESSAGES, HISTORY_SUMMARY_CHUNK)
+
+def sse_event(payload):
+    """Format a JSON payload as a server-sent event."""
+    return f"data: {json.dumps(payload)}\n\n"
+
+# Streamed bodies must reach the client as they are produced, not once a proxy has buffered them
+STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+def event_stream(body, mimetype='text/event-stream'):
+    return Response(stream_with_context(body), mimetype=mimetype, headers=STREAM_HEADERS)
+
+SESSION_MAX = int(os.environ.get('SESSION_MAX', 1000))
+SESSION_IDLE_SECONDS = float(os.environ.get('SESSION_IDLE_SECONDS', 1800))
+DEFAULT_SYSTEM_PROMPT = (
+    "You are an IELTS speaking examiner. You should evaluate the student's English speaking ability "
+    "according to the IELTS criteria: Fluency and Coherence, Lexical Resource, Grammatical Range "
+    "and Accuracy, and Pronunciation. Keep your responses concise and natural like a real examiner. "
+    "Do not provide scores during the test, only at the end when explicitly asked."
+)
+
+class SessionNotFoundError(Exception):
+    """Raised when a chat request references an unknown or evicted session."""
+
+class InvalidSpeechTimingError(ValueError):
+    """Raised when a chat request's "speech" timing is malformed."""
+
+FLUENCY_WORD = re.compile(r"[^\W_]+(?:['’][^\W_]+)*")
+HESITATION_FILLERS = frozenset({'um', 'umm', 'uh', 'uhh', 'er', 'err', 'erm', 'hm', 'hmm', 'like'})
+
+def speech_features(transcript, duration_seconds, pauses=0):
+    """Fluency features of one spoken answer, from a single pass over its words."""
+    words = FLUENCY_WORD.findall(transcript.lower())
+    hesitations = repeats = 0
+    previous = None
+    for word in words:
+        # Whole words only, so "her" or "person" no longer count as an "er"
+        if word in HESITATION_FILLERS or (word == 'know' and previous == 'you'):
+            hesitations += 1
+        if word == previous:
+            repeats += 1
+        previous = word
+    duration_seconds = max(duration_seconds, 0.0)
+    return {
+        "words": len(words),
+        "duration_seconds": duration_seconds,
+        "words_per_minute": round(len(words) / duration_seconds * 60) if duration_seconds else 0,
+        "hesitations": hesitations,
+        "repeats": repeats,
+        "pauses": max(pauses, 0)
+    }
+
+def request_speech_features(data):
+    """Fluency features of a chat request's message when it was spoken, None when it was typed."""
+    speech = data.get('speech')
+    if speech is None:
+        return None
+    try:
+        return speech_features(data.get('message', ''), float(speech.get('duration_seconds', 0)),
+                               int(speech.get('pauses', 0)))
+    except (AttributeError, TypeError, ValueError) as e:
+        raise InvalidSpeechTimingError(str(e)) from e
+
+class FluencyTotals:
+    """Running fluency aggregates of a session's spoken answers, so the scoring summary never revisits a turn."""
+
+    def __init__(self):
+        self.responses = 0
+        self.words = 0
+        self.duration_seconds = 0.0
+        self.hesitations = 0
+        self.repeats = 0
+        self.pauses = 0
+
+    def add(self, features):
+        self.responses += 1
+        self.words += features["words"]
+        self.duration_seconds += features["duration_seconds"]
+        self.hesitations += features["hesitations"]
+        self.repeats += features["repeats"]
+        self.pauses += features["pauses"]
+
+    def summary(self):
+        """Speech metadata for the scoring prompt."""
+        if not self.responses:
+            return "No speech metadata available."
+        words_per_minute = round(self.words / self.duration_seconds * 60) if self.duration_seconds else 0
+        if self.hesitations <= 5:
+            fluidity = "Very fluid"
+        elif self.hesitations <= 15:
+            fluidity = "Moderately fluid"
+        else:
+            fluidity = "Less fluid with noticeable hesitations"
+        return (
+            "Speech Metadata Summary:\n"
+            f"- Total responses: {self.responses}\n"
+            f"- Average speaking rate: {words_per_minute} words per minute\n"
+            f"- Total hesitation markers: {self.hesitations}\n"
+            f"- Repeated words: {self.repeats}\n"
+            f"- Long pauses: {self.pauses}\n"
+            f"- Speaking fluidity: {fluidity}"
+        )
+
+class ConversationStore:
+    """Bounded, server-held conversation histories keyed by session id."""
+
+    def __init__(self, max_sessions=SESSION_MAX, idle_seconds=SESSION_IDLE_SECONDS):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _evict(self):
+        # Sessions are kept in least-recently-used order, so idle ones sit at the front
+        now = time.monotonic()
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if len(self.sessions) > self.max_sessions or now - session["last_access"] > self.idle_seconds:
+                del self.sessions[session_id]
+            else:
+                break
+
+    def create(self, system_prompt=None, greeting=None):
+        session_id = uuid.uuid4().hex
+        history = [{"role": "assistant", "content": greeting}] if greeting else []
+        with self.lock:
+            self.sessions[session_id] = {
+                "system_prompt": system_prompt or DEFAULT_SYSTEM_PROMPT,
+                "history": history,
+                "fluency": FluencyTotals(),
+                "last_access": time.monotonic()
+            }
+            self._evict()
+        return session_id
+
+    def _touch(self, session_id):
+        self._evict()
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise SessionNotFoundError(session_id)
+        session["last_access"] = time.monotonic()
+        self.sessions.move_to_end(session_id)
+        return session
+
+    def build_messages(self, session_id, user_message):
+        """Assemble the full prompt for a new user turn without recording it yet."""
+        with self.lock:
+            session = self._touch(session_id)
+            return (
+                [{"role": "system", "content": session["system_prompt"]}]
+                + session["history"]
+                + [{"role": "user", "content": user_message}]
+            )
+
+    def record_turn(self, session_id, user_message, reply, fluency=None):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                session["history"].append({"role": "user", "content": user_message})
+                session["history"].append({"role": "assistant", "content": reply})
+                if fluency is not None:
+                    session["fluency"].add(fluency)
+
+    def fluency_summary(self, session_id):
+        with self.lock:
+            return self._touch(session_id)["fluency"].summary()
+
+    def delete(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self.sessions)
+
+conversations = ConversationStore()
+
+def resolve_messages(data):
+    """Return the prompt messages for a chat request, from the session store or the request body."""
+    session_id = data.get('session_id')
+    if session_id:
+        return conversations.build_messages(session_id, data.get('message', ''))
+    return data.get('messages', [])
+
+def read_chat_request(data, priority=None):
+    """Parse a chat turn request and assemble its compacted prompt.
+
+    Returns a dict of the model, endpoint, priority, cache flag, session id, user message, the message's
+    fluency features and the prompt messages; raises InvalidSpeechTimingError or SessionNotFoundError.
+    """
+    endpoint = data.get('endpoint', DEFAULT_OLLAMA_ENDPOINT)
+    fluency = request_speech_features(data)
+    return {
+        "model": data.get('model', CONVERSATION_MODEL),
+        "endpoint": endpoint,
+        "priority": PRIORITIES.get(data.get('priority'), PRIORITY_INTERACTIVE) if priority is None else priority,
+        "cache": data.get('cache', True),
+        "session_id": data.get('session_id'),
+        "message": data.get('message', ''),
+        "fluency": fluency,
+        "messages": history_compactor.compact(resolve_messages(data), endpoint)
+    }
+
+def open_reply_stream(data, priority=None):
+    """Start streaming the reply to a chat turn request; returns (chat request, token iterator).
+
+    The first token is pulled before returning, so rejections and upstream failures raise here, while the
+    caller can still answer with a proper status code.
+    """
+    chat_request = read_chat_request(data, priority)
+    stream = cached_stream_ollama_api(chat_request["model"], chat_request["messages"], chat_request["endpoint"],
+                                      chat_request["cache"], chat_request["priority"])
+    first_token = next(stream, '')
+    return chat_request, itertools.chain([first_token], stream)
+
+def record_reply(chat_request, reply):
+    """Add a completed turn to the request's session, if it has one."""
+    if chat_request["session_id"]:
+        conversations.record_turn(chat_request["session_id"], chat_request["message"], reply,
+                                  chat_request["fluency"])
+
+@app.route('/api/session', methods=['POST'])
+def create_session():
+    data = request.get_json(silent=True) or {}
+    session_id = conversations.create(data.get('system_prompt'), data.get('greeting'))
+    return jsonify({"session_id": session_id})
+
+@app.route('/api/session/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    conversations.delete(session_id)
+    return jsonify({"status": "ok"})
+
+def chat_error(e):
+    """Map an exception raised while talking to Ollama to (JSON payload, status, headers)."""
+    if isinstance(e, SessionNotFoundError):
+        return {"error": "Unknown or expired session", "details": str(e)}, 404, {}
+    if isinstance(e, InvalidSpeechTimingError):
+        return {"error": "Invalid speech timing", "details": str(e)}, 400, {}
+    if isinstance(e, AdmissionRejectedError):
+        return ({"error": "The examiner is busy, please retry shortly", "details": str(e)}, 429,
+                {'Retry-After': str(e.retry_after)})
+    if isinstance(e, (CircuitOpenError, NoBackendAvailableError)):
+        return {"error": "Ollama is temporarily unavailable", "details": str(e)}, 503, {}
+    if isinstance(e, requests.Timeout):
+        print(f"Timeout calling Ollama API: {str(e)}")
+        return {"error": "Ollama did not respond in time", "details": str(e)}, 504, {}
+    print(f"Error calling Ollama API: {str(e)}")
+    return {"error": "Failed to get response from Ollama", "details": str(e)}, 500, {}
+
+def chat_error_response(e):
+    payload, status, headers = chat_error(e)
+    return jsonify(payload), status, headers
+
+def chat_reply(chat_request, response_data, error):
+    """Record a non-streamed reply in its session and return the /api/chat (payload, status)."""
+    if error:
+        return {"error": error}, 500
+    reply = response_data["message"]["content"]
+    record_reply(chat_request, reply)
+    return {"response": reply}, 200
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
     try:
-        data = request.json
-        model = data.get('model', 'gemma3:12b')
-        messages = data.get('messages', [])
-        endpoint = data.get('endpoint', 'http://localhost:11434')
-        
-        response_data, error = handle_ollama_api(model, messages, endpoint)
-        if error:
-            return jsonify({"error": error}), 500
-        
-        return jsonify({"response": response_data["message"]["content"]})
-        
+        chat_request = read_chat_request(request.json)
+        payload, status = chat_reply(chat_request, *cached_ollama_api(
+            chat_request["model"], chat_request["messages"], chat_request["endpoint"],
+            chat_request["cache"], chat_request["priority"]))
+        return jsonify(payload), status
     except Exception as e:
-        print(f"Error calling Ollama API: {str(e)}")
-        return jsonify({"error": "Failed to get response from Ollama", "details": str(e)}), 500
+        return chat_error_response(e)
 
-@app.route('/api/punctuate', methods=['POST'])
-def punctuate_text():
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    try:
+        chat_request, stream = open_reply_stream(request.json)
+    except Exception as e:
+        return chat_error_response(e)
+
+    def generate():
+        reply = ReplyEvents(chat_request)
+        try:
+            for token in stream:
+                event = reply.token(token)
+                if event:
+                    yield event
+            yield reply.done()
+        except Exception as e:
+            yield reply.error(e)
+
+    return event_stream(generate())
+
+def synthesize_while_streaming(tokens, **options):
+    """Pass LLM tokens through as ('token', token) while synthesizing each completed sentence in the background.
+
+    Sentences come back in order as ('audio', sentence, future) once their synthesis has finished, so audio
+    for the start of the reply is ready before generation ends.
+    """
+    pending = deque()
+    sentences = SentenceBuffer()
+
+    def submit(complete):
+        for sentence in complete:
+            pending.append((sentence, tts_executor.submit(synthesize_speech, sentence, **options)))
+
+    try:
+        for token in tokens:
+            yield 'token', token
+            submit(sentences.feed(token))
+            while pending and pending[0][1].done():
+                yield ('audio',) + pending.popleft()
+        submit(sentences.flush())
+        while pending:
+            yield ('audio',) + pending.popleft()
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+def speech_segment_event(index, sentence, future):
+    """The SSE payload for a sentence's finished synthesis future: its audio, or the error that replaced it."""
+    try:
+        audio, mimetype = future.result()
+    except Exception as e:
+        # A failed sentence should not cost the reply text; the client can speak it another way
+        print(f"Error generating TTS: {str(e)}")
+        return {"audio_error": "Failed to generate speech", "index": index, "text": sentence, "details": str(e)}
+    return {"segment": audio_segment(index, sentence, audio, mimetype)}
+
+class ReplyEvents:
+    """The SSE events of a streamed reply (/api/chat/stream and /api/turn); done() records the finished turn."""
+
+    def __init__(self, chat_request):
+        self.chat_request = chat_request
+        self.tokens = []
+        self.segments = 0
+
+    def token(self, token):
+        """The event for a reply token, or None for an empty one."""
+        if not token:
+            return None
+        self.tokens.append(token)
+        return sse_event({"token": token})
+
+    def speech(self, sentence, future):
+        """The event for a sentence's finished synthesis, numbered in reply order."""
+        event = sse_event(speech_segment_event(self.segments, sentence, future))
+        self.segments += 1
+        return event
+
+    def done(self):
+        record_reply(self.chat_request, ''.join(self.tokens))
+        return sse_event({"done": True})
+
+    def error(self, e):
+        print(f"Error streaming from Ollama API: {str(e)}")
+        return sse_event({"error": "Failed to get response from Ollama", "details": str(e)})
+
+@app.route('/api/turn', methods=['POST'])
+def turn():
+    """Run one examiner turn: stream the reply text and its synthesized speech as a single SSE stream."""
+    data = request.json
+    tts_options = tts_params(data, request.accept_mimetypes)
+    del tts_options['text']
+    try:
+        chat_request, stream = open_reply_stream(data, PRIORITY_INTERACTIVE)
+    except Exception as e:
+        return chat_error_response(e)
+
+    def generate():
+        reply = ReplyEvents(chat_request)
+        try:
+            for kind, *event in synthesize_while_streaming(stream, **tts_options):
+                sse = reply.token(*event) if kind == 'token' else reply.speech(*event)
+                if sse:
+                    yield sse
+            yield reply.done()
+        except Exception as e:
+            yield reply.error(e)
+
+    return event_stream(generate())
+
+SCORING_WORKERS = int(os.environ.get('SCORING_WORKERS', 2))
+SCORING_JOB_TTL_SECONDS = float(os.environ.get('SCORING_JOB_TTL_SECONDS', 3600))
+SCORING_PROGRESS_EVERY_TOKENS = 20
+DEFAULT_SCORING_PROMPT = (
+    "Please analyze my complete speaking performance throughout this conversation and provide IELTS scores for:\n"
+    "1. Fluency and Coherence: Evaluate logical flow, topic development, and coherence of ideas.\n"
+    "2. Lexical Resource: Assess vocabulary range, appropriateness, and accuracy.\n"
+    "3. Grammatical Range and Accuracy: Judge grammatical structures and correctness.\n"
+    "4. Pronunciation: While you cannot hear my pronunciation directly, try to evaluate based on my choice "
+    "of words and any metadata about my speech.\n\n"
+    "Provide a score out of 9 for each category and an overall band score, with detailed feedback."
+)
+
+class ScoringJobs:
+    """Runs scoring requests on a background worker pool and records their progress events."""
+
+    def __init__(self, workers):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scoring')
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, model, messages, endpoint):
+        self._prune()
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "tokens": 0,
+            "result": None,
+            "error": None,
+            "created": time.time(),
+            "events": [{"type": "queued"}],
+            "changed": threading.Condition(),
+            "listeners": set()
+        }
+        with self.lock:
+            self.jobs[job_id] = job
+        self.executor.submit(self._run, job, model, messages, endpoint)
+        return job_id
+
+    def _emit(self, job, event, **updates):
+        with job["changed"]:
+            job.update(updates)
+            job["events"].append(event)
+            job["changed"].notify_all()
+            for listener in job["listeners"]:
+                listener.set()
+            job["listeners"].clear()
+
+    def _run(self, job, model, messages, endpoint):
+        self._emit(job, {"type": "running"}, status="running")
+        for _ in range(10):
+            try:
+                tokens = []
+                for token in cached_stream_ollama_api(model, messages, endpoint, use_cache=False,
+                                                      priority=PRIORITY_SCORING):
+                    tokens.append(token)
+                    if len(tokens) % SCORING_PROGRESS_EVERY_TOKENS == 0:
+                        self._emit(job, {"type": "progress", "tokens": len(tokens)}, tokens=len(tokens))
+                result = ''.join(tokens)
+                self._emit(job, {"type": "done", "result": result}, status="done", result=result, tokens=len(tokens))
+                return
+            except AdmissionRejectedError as e:
+                # Background jobs wait out a full queue instead of failing
+                self._emit(job, {"type": "waiting", "retry_after": e.retry_after})
+                time.sleep(e.retry_after)
+            except Exception as e:
+                print(f"Error running scoring job {job['id']}: {str(e)}")
+                self._emit(job, {"type": "error", "error": str(e)}, status="error", error=str(e))
+                return
+        self._emit(job, {"type": "error", "error": "Scoring queue stayed full"}, status="error",
+                   error="Scoring queue stayed full")
+
+    def _prune(self):
+        cutoff = time.time() - SCORING_JOB_TTL_SECONDS
+        with self.lock:
+            for job_id in [job_id for job_id, job in self.jobs.items() if job["created"] < cutoff]:
+                del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    @staticmethod
+    def snapshot(job):
+        with job["changed"]:
+            return {key: job[key] for key in ("id", "status", "tokens", "result", "error")}
+
+    def watch(self, job, index, listener):
+        """Return the job's events from index on; when there are none yet, listener.set() is called on the next one.
+
+        For callers that cannot block in events(); pass the listener to unwatch() if they stop waiting.
+        """
+        with job["changed"]:
+            pending = job["events"][index:]
+            if not pending:
+                job["listeners"].add(listener)
+            return pending
+
+    def unwatch(self, job, listener):
+        with job["changed"]:
+            job["listeners"].discard(listener)
+
+    def events(self, job, timeout=15):
+        """Yield the job's events as they happen; yields None as a heartbeat while waiting."""
+        index = 0
+        while True:
+            with job["changed"]:
+                if index >= len(job["events"]):
+                    job["changed"].wait(timeout)
+                pending = job["events"][index:]
+                index += len(pending)
+            if not pending:
+                yield None
+            for event in pending:
+                yield event
+                if event["type"] in ("done", "error"):
+                    return
+
+scoring_jobs = ScoringJobs(SCORING_WORKERS)
+
+def submit_scoring(data):
+    """Queue a scoring job for a /api/score request body and return its id."""
+    prompt = data.get('prompt') or DEFAULT_SCORING_PROMPT
+    if data.get('session_id'):
+        # Speech metadata accumulated turn by turn on the server
+        prompt += "\n\n" + conversations.fluency_summary(data['session_id'])
+    if data.get('notes'):
+        prompt += "\n\n" + data['notes']
+    if data.get('session_id'):
+        messages = conversations.build_messages(data['session_id'], prompt)
+    else:
+        messages = data.get('messages', []) + [{"role": "user", "content": prompt}]
+    return scoring_jobs.submit(data.get('model', SCORING_MODEL), messages, data.get('endpoint', DEFAULT_OLLAMA_ENDPOINT))
+
+@app.route('/api/score', methods=['POST'])
+def start_scoring():
+    try:
+        job_id = submit_scoring(request.json)
+        return jsonify({"job_id": job_id, "status": "queued"}), 202
+    except Exception as e:
+        return chat_error_response(e)
+
+UNKNOWN_SCORING_JOB = {"error": "Unknown scoring job"}
+
+def scoring_status_reply(job_id):
+    """The /api/score/<job_id> (payload, status)."""
+    job = scoring_jobs.get(job_id)
+    if job is None:
+        return UNKNOWN_SCORING_JOB, 404
+    return ScoringJobs.snapshot(job), 200
+
+def scoring_event_line(event):
+    """Format a ScoringJobs.events() item for the SSE stream; None becomes a heartbeat."""
+    # SSE comment lines keep proxies such as pagekite from closing an idle stream
+    return sse_event(event) if event is not None else ": keep-alive\n\n"
+
+@app.route('/api/score/<job_id>', methods=['GET'])
+def scoring_status(job_id):
+    payload, status = scoring_status_reply(job_id)
+    return jsonify(payload), status
+
+@app.route('/api/score/<job_id>/events', methods=['GET'])
+def scoring_events(job_id):
+    job = scoring_jobs.get(job_id)
+    if job is None:
+        return jsonify(UNKNOWN_SCORING_JOB), 404
+    return event_stream(scoring_event_line(event) for event in scoring_jobs.events(job))
+
+PUNCTUATION_CACHE_MAX_ENTRIES = int(os.environ.get('PUNCTUATION_CACHE_MAX_ENTRIES', 4096))
+
+class _FallbackPunctuation(Exception):
+    """Carries a fallback result out of the memo; lru_cache does not store calls that raise."""
+
+    def __init__(self, text):
+        super().__init__(text)
+        self.text = text
+
+@lru_cache(maxsize=PUNCTUATION_CACHE_MAX_ENTRIES)
+def _punctuate_normalized(text):
+    if not isinstance(punctuator, BudgetedPunctuator):
+        return punctuator.add_punctuation(text)
+    result, from_model = punctuator.punctuate(text)
+    # An over-budget or failed call (likely on cold model pages) must not pin the heuristic output
+    if not from_model:
+        raise _FallbackPunctuation(result)
+    return result
+
+def punctuate_segment(text):
+    """Punctuate one transcript segment, memoized on its whitespace-normalized text."""
+    try:
+        return _punctuate_normalized(' '.join(text.split()))
+    except _FallbackPunctuation as fallback:
+        return fallback.text
+
+def punctuation_reply(data):
+    """The /api/punctuate (payload, status) for a {"text": ...} body."""
+    text = ''
     try:
-        data = request.json
         text = data.get('text', '')
-        
         if not text.strip():
-            return jsonify({"text": text})
-        
-        result = punctuator.add_punctuation(text)
-        return jsonify({"text": result})
-        
+            return {"text": text}, 200
+        return {"text": punctuate_segment(text)}, 200
     except Exception as e:
         print(f"Error in punctuation: {str(e)}")
-        return jsonify({"error": str(e), "text": text}), 500
+        return {"error": str(e), "text": text}, 500
+
+def punctuation_batch_reply(data):
+    """Punctuate many final ASR segments: {"segments": [text, ...]} -> ({"segments": [...]}, status)."""
+    segments = (data or {}).get('segments')
+    if not isinstance(segments, list) or not all(isinstance(segment, str) for segment in segments):
+        return {"error": "segments must be a list of strings"}, 400
+    try:
+        return {"segments": [punctuate_segment(segment) if segment.strip() else segment for segment in segments]}, 200
+    except Exception as e:
+        print(f"Error in punctuation: {str(e)}")
+        return {"error": str(e), "segments": segments}, 500
+
+@app.route('/api/punctuate', methods=['POST'])
+def punctuate_text():
+    payload, status = punctuation_reply(request.json)
+    return jsonify(payload), status
+
+@app.route('/api/punctuate/batch', methods=['POST'])
+def punctuate_batch():
+    payload, status = punctuation_batch_reply(request.json)
+    return jsonify(payload), status
+
+# A recognizer restarts its result list per utterance, so a few hundred results is already a long answer
+PUNCTUATION_SESSION_MAX_SEGMENTS = int(os.environ.get('PUNCTUATION_SESSION_MAX_SEGMENTS', 1000))
+
+class PunctuationSession:
+    """Transcript state for one live punctuation connection.
+
+    The recognizer's results are kept by index; final ones are punctuated (once, through the segment memo)
+    and interim ones are shown as heard. Each update returns only the span of the transcript that changed.
+    """
+
+    def __init__(self):
+        self.segments = []
+        self.transcript = ''
+
+    def update(self, results, length=None):
+        """Apply {"index", "text", "final"} results; returns {"start", "end", "text"} replacing transcript[start:end].
+
+        Raises ValueError for an index that is neither an existing result nor the next one, or past the cap.
+        """
+        for result in results:
+            index = int(result['index'])
+            if not 0 <= index <= len(self.segments) or index >= PUNCTUATION_SESSION_MAX_SEGMENTS:
+                raise ValueError(f"Result index {index} out of range (have {len(self.segments)} results)")
+            text = result.get('text', '')
+            segment = punctuate_segment(text) if result.get('final') and text.strip() else text.strip()
+            if index == len(self.segments):
+                self.segments.append(segment)
+            else:
+                self.segments[index] = segment
+        if length is not None:
+            length = int(length)
+            if not 0 <= length <= len(self.segments):
+                raise ValueError(f"Length {length} out of range (have {len(self.segments)} results)")
+            del self.segments[length:]
+
+        transcript = ' '.join(segment for segment in self.segments if segment)
+        previous, self.transcript = self.transcript, transcript
+        start = len(os.path.commonprefix([previous, transcript]))
+        suffix = len(os.path.commonprefix([previous[start:][::-1], transcript[start:][::-1]]))
+        return {"start": start, "end": len(previous) - suffix, "text": transcript[start:len(transcript) - suffix]}
 
-@app.route('/api/tts', methods=['POST'])
+    def handle(self, message):
+        """Apply one raw {"results": [...], "length": n} frame; returns the reply frame, an error frame if invalid."""
+        try:
+            message = json.loads(message)
+            return json.dumps(self.update(message.get('results', []), message.get('length')))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"Error in punctuation session: {str(e)}")
+            return json.dumps({"error": str(e)})
+
+sock = Sock(app) if Sock else None
+
+if sock:
+    @sock.route('/ws/punctuate')
+    def punctuate_socket(ws):
+        """Live punctuation: the client sends {"results": [...], "length": n} per recognizer event and gets
+        back one frame per message with the changed span of the punctuated transcript."""
+        session = PunctuationSession()
+        while True:
+            ws.send(session.handle(ws.receive()))
+
+TTS_AUDIO_MAX_AGE_SECONDS = int(os.environ.get('TTS_AUDIO_MAX_AGE_SECONDS', 24 * 3600))
+
+def negotiate_codec(data, accept_mimetypes):
+    """Pick (codec, bitrate) from an explicit codec/bitrate parameter, else from audio types named in Accept."""
+    codec = data.get('codec')
+    if codec is None:
+        accepted = set(accept_mimetypes.values())
+        codec = next((name for name, spec in AUDIO_CODECS.items() if spec['mimetype'] in accepted), TTS_DEFAULT_CODEC)
+    bitrate = data.get('bitrate')
+    return (
+        codec if codec in AUDIO_CODECS else None,
+        bitrate if bitrate and BITRATE_PATTERN.match(str(bitrate)) else None
+    )
+
+def tts_params(data, accept_mimetypes):
+    """Read the synthesize_speech() keyword arguments from a TTS request's JSON body or query string."""
+    voice = data.get('voice')
+    codec, bitrate = negotiate_codec(data, accept_mimetypes)
+    return {
+        'text': data.get('text', ''),
+        'language': data.get('language', 'en'),
+        'slow': data.get('slow', False) in (True, 'true', '1'),
+        'tld': data.get('tld', 'co.in'),
+        'voice': voice if voice in ('male', 'female') else None,
+        'codec': codec,
+        'bitrate': bitrate
+    }
+
+def wants_binary_audio(data, args, accept_mimetypes):
+    if args.get('format') == 'binary' or data.get('format') == 'binary':
+        return True
+    best = accept_mimetypes.best_match(['application/json', 'audio/mpeg', 'audio/ogg', 'audio/wav'])
+    return best is not None and best.startswith('audio/')
+
+def read_tts_request(method, body, args, accept_mimetypes):
+    """Return (synthesize_speech() keyword arguments, whether to answer with raw audio) for an /api/tts request."""
+    # GET takes query parameters so an <audio> element can fetch (and range-request) the audio directly
+    data = body if method == 'POST' else args
+    return tts_params(data, accept_mimetypes), method == 'GET' or wants_binary_audio(data, args, accept_mimetypes)
+
+def audio_payload(audio, mimetype):
+    return {"audio": base64.b64encode(audio).decode('utf-8'), "mimetype": mimetype}
+
+def audio_segment(index, sentence, audio, mimetype):
+    """One sentence of synthesized speech, as sent by /api/turn and /api/tts/stream."""
+    return {"index": index, "text": sentence, **audio_payload(audio, mimetype)}
+
+def tts_error(e):
+    print(f"Error generating TTS: {str(e)}")
+    return {"error": "Failed to generate speech", "details": str(e)}
+
+def audio_etag(audio):
+    """A strong ETag for raw audio: the hash of its content."""
+    return hashlib.sha256(audio).hexdigest()
+
+def vary_on_codec(response):
+    # The codec may be negotiated from Accept, so caches must key on it
+    response.vary.add('Accept')
+    return response
+
+def send_audio(audio, mimetype='audio/mpeg'):
+    """Send raw audio with an ETag and Range support."""
+    return vary_on_codec(send_file(
+        io.BytesIO(audio),
+        mimetype=mimetype,
+        conditional=True,
+        etag=audio_etag(audio),
+        max_age=TTS_AUDIO_MAX_AGE_SECONDS
+    ))
+
+@app.route('/api/tts', methods=['GET', 'POST'])
 def text_to_speech():
     try:
-        data = request.json
-        text = data.get('text', '')
-        language = data.get('language', 'en')
-        slow = data.get('slow', False)
-        tld = data.get('tld', 'co.in')
-        
-        audio_data = generate_speech(text, language, slow, tld)
-        
-        return jsonify({"audio": audio_data})
-        
+        params, binary = read_tts_request(request.method, request.json if request.method == 'POST' else None,
+                                          request.args, request.accept_mimetypes)
+        audio, mimetype = synthesize_speech(**params)
+        return send_audio(audio, mimetype) if binary else jsonify(audio_payload(audio, mimetype))
     except Exception as e:
-        print(f"Error generating TTS: {str(e)}")
-        return jsonify({"error": "Failed to generate speech", "details": str(e)}), 500
+        return jsonify(tts_error(e)), 500
+
+@app.route('/api/tts/stream', methods=['POST'])
+def text_to_speech_stream():
+    params = tts_params(request.json, request.accept_mimetypes)
+
+    def generate():
+        try:
+            segments = synthesize_sentences(**params)
+            for index, (sentence, (audio, mimetype)) in enumerate(segments):
+                yield json.dumps(audio_segment(index, sentence, audio, mimetype)) + '\n'
+        except Exception as e:
+            yield json.dumps(tts_error(e)) + '\n'
+
+    return event_stream(generate(), mimetype='application/x-ndjson')
+
+@app.route('/api/tts/engines', methods=['GET'])
+def list_tts_engines():
+    return jsonify({
+        "engine": TTS_ENGINE,
+        "fallbacks": TTS_FALLBACK_ENGINES,
+        "engines": [
+            {"name": name, "mimetype": engine.mimetype, "capabilities": engine.capabilities}
+            for name, engine in TTS_ENGINES.items()
+        ],
+        "codecs": {
+            name: {"mimetype": spec['mimetype'], "bitrate": spec['bitrate'], "available": FFMPEG_PATH is not None}
+            for name, spec in AUDIO_CODECS.items()
+        }
+    })
+
+QUESTION_BANK_PATH = os.environ.get('QUESTION_BANK_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'question_bank.json'))
+AUDIO_PACK_DIR = os.environ.get('AUDIO_PACK_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'audio_pack'))
+AUDIO_PACK_MANIFEST = os.path.join(AUDIO_PACK_DIR, 'manifest.json')
+AUDIO_PACK_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+AUDIO_EXTENSIONS = {'audio/mpeg': '.mp3', 'audio/ogg': '.ogg', 'audio/wav': '.wav'}
+
+def load_question_bank():
+    with open(QUESTION_BANK_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+def question_bank_prompts(bank):
+    """Every fixed prompt in the bank that the examiner speaks, in order and without duplicates."""
+    prompts = [bank['part1']['intro'], *bank['part1']['questions'],
+               bank['part2']['intro'], *bank['part2']['cue_cards'],
+               bank['part3']['intro']]
+    for questions in bank['part3']['topics'].values():
+        prompts.extend(questions)
+    prompts.append(bank['conclusion'])
+    return list(dict.fromkeys(prompts))
+
+def load_audio_pack_manifest():
+    try:
+        with open(AUDIO_PACK_MANIFEST, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"prompts": {}}
+
+@app.cli.command('build-audio-pack')
+@click.option('--codec', default=TTS_DEFAULT_CODEC, help='Output codec (opus, mp3 or original).')
+@click.option('--bitrate', default=None, help='Output bitrate, e.g. 24k.')
+@click.option('--force', is_flag=True, help='Re-render prompts that are already in the pack.')
+def build_audio_pack(codec, bitrate, force):
+    """Pre-render every question bank prompt to audio and write the pack manifest."""
+    manifest = load_audio_pack_manifest()
+    if force or (manifest.get('engine'), manifest.get('codec'), manifest.get('bitrate')) != (TTS_ENGINE, codec, bitrate):
+        manifest = {"prompts": {}}
+    prompts = [text for text in question_bank_prompts(load_question_bank()) if text not in manifest['prompts']]
+    os.makedirs(AUDIO_PACK_DIR, exist_ok=True)
+
+    def render(text):
+        audio, mimetype = synthesize_speech(text, 'en', False, 'co.in', None, codec, bitrate)
+        # Content-hashed names are what make the immutable cache headers safe
+        filename = hashlib.sha256(audio).hexdigest()[:20] + AUDIO_EXTENSIONS.get(mimetype, '.bin')
+        with open(os.path.join(AUDIO_PACK_DIR, filename), 'wb') as f:
+            f.write(audio)
+        return filename
+
+    for text, filename in zip(prompts, tts_executor.map(render, prompts)):
+        manifest['prompts'][text] = filename
+        click.echo(f"{filename}  {text[:60]}")
+
+    manifest.update(engine=TTS_ENGINE, codec=codec, bitrate=bitrate, built=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()))
+    with tempfile.NamedTemporaryFile('w', dir=AUDIO_PACK_DIR, suffix='.tmp', delete=False, encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f.name, AUDIO_PACK_MANIFEST)
+    click.echo(f"Rendered {len(prompts)} prompts; {len(manifest['prompts'])} in {AUDIO_PACK_DIR}")
+
+def question_bank_with_audio():
+    """The question bank plus an "audio" map from prompt text to its prebuilt audio URL."""
+    bank = load_question_bank()
+    # Prompts missing from the pack (not built yet, or edited since) are synthesized on demand by the client
+    prompts = load_audio_pack_manifest()['prompts']
+    bank['audio'] = {text: f"/audio-pack/{filename}" for text, filename in prompts.items()}
+    return bank
+
+def question_bank_reply():
+    """The /api/questions (payload, status)."""
+    try:
+        return question_bank_with_audio(), 200
+    except Exception as e:
+        print(f"Error loading question bank: {str(e)}")
+        return {"error": "Failed to load question bank", "details": str(e)}, 500
+
+@app.route('/api/questions', methods=['GET'])
+def question_bank():
+    payload, status = question_bank_reply()
+    return jsonify(payload), status
+
+@app.route('/audio-pack/<path:filename>', methods=['GET'])
+def audio_pack_file(filename):
+    response = send_from_directory(AUDIO_PACK_DIR, filename, conditional=True)
+    response.headers['Cache-Control'] = AUDIO_PACK_CACHE_CONTROL
+    return response
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "ok"})
+    return jsonify({
+        "status": "ok",
+        "upstreams": upstream.status(),
+        "backends": backend_pool.status(),
+        "sessions": len(conversations)
+    })
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        "response_cache": response_cache.stats(),
+        "tts_cache": tts_cache.stats(),
+        "punctuation_cache": _punctuate_normalized.cache_info()._asdict(),
+        "punctuator": punctuator.stats() if isinstance(punctuator, BudgetedPunctuator) else {"engine": "heuristic"},
+        "admission": admission.stats(),
+        "model_latency": model_warmer.status()["latency"]
+    })
+
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    # One model warm on one healthy backend is enough; a down box or one without a model must not block readiness
+    ready = model_warmer.ready(backend_pool.serves)
+    return jsonify({"ready": ready, **model_warmer.status()}), 200 if ready else 503
 
 # Serve the frontend files
 @app.route('/', defaults={'path': ''})
@@ -155,8 +2216,22 @@ def serve_static(path):
     except:
         return send_from_directory('static', 'index.html')
 
+def start_background_services():
+    """Start the background threads if they are not running yet; safe to call from every request."""
+    model_warmer.start()
+    backend_pool.start()
+
+@app.before_request
+def ensure_background_services():
+    # Under flask run or gunicorn nothing runs the __main__ block, and without the health checks an
+    # ejected backend is never readmitted; start the threads in whichever worker serves a request
+    start_background_services()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 80))
     # Create a voices directory if it doesn't exist
     os.makedirs('static/voices', exist_ok=True)
+    # The debug reloader runs this block in a watcher process too; only the serving child starts threads
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_services()
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
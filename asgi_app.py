@@ -0,0 +1,553 @@
+# asgi_app.py - Async (ASGI) serving mode for the IELTS Examiner backend
+#
+# Serves the same contracts as app.py for every route the frontend uses: sessions, chat and turns,
+# scoring, TTS, punctuation (HTTP and WebSocket), the question bank and its audio pack. Sessions,
+# caches, admission control, backend scheduling and history compaction are the ones in app.py;
+# only the Ollama calls differ, running as coroutines over async HTTP clients instead of holding a
+# worker thread. Blocking work (TTS engines, disk caches) runs on worker threads, while waits for a model
+# slot, a scoring event or synthesized audio are awaited on the event loop without holding one.
+#
+# Run with: hypercorn asgi_app:app --bind 0.0.0.0:8000
+import asyncio
+import io
+import json
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+import httpx
+from quart import Quart, Response, request, jsonify, send_file, send_from_directory, websocket
+
+from app import (
+    AUDIO_PACK_CACHE_CONTROL,
+    AUDIO_PACK_DIR,
+    CircuitBreaker,
+    CircuitOpenError,
+    OLLAMA_CONNECT_TIMEOUT,
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_READ_TIMEOUT,
+    OLLAMA_POOL_SIZE,
+    PRIORITY_INTERACTIVE,
+    PunctuationSession,
+    ReplyEvents,
+    SentenceBuffer,
+    STREAM_HEADERS,
+    TTS_AUDIO_MAX_AGE_SECONDS,
+    UNKNOWN_SCORING_JOB,
+    admission,
+    audio_etag,
+    audio_payload,
+    audio_segment,
+    backend_pool,
+    chat_error,
+    chat_reply,
+    conversations,
+    lookup_reply,
+    model_warmer,
+    punctuation_batch_reply,
+    punctuation_reply,
+    question_bank_reply,
+    read_chat_request,
+    read_tts_request,
+    scoring_event_line,
+    scoring_jobs,
+    scoring_status_reply,
+    start_background_services,
+    store_reply,
+    submit_scoring,
+    submit_sentences,
+    synthesize_speech,
+    tts_error,
+    tts_executor,
+    tts_params,
+    vary_on_codec,
+)
+
+app = Quart(__name__, static_folder='static')
+
+class AsyncUpstreamClient:
+    """Async counterpart of app.UpstreamClient: one pooled httpx client and breaker per endpoint."""
+
+    def __init__(self):
+        self.clients = {}
+        self.breakers = {}
+
+    def _get(self, endpoint):
+        if endpoint not in self.clients:
+            self.clients[endpoint] = httpx.AsyncClient(
+                base_url=endpoint,
+                timeout=httpx.Timeout(OLLAMA_READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT),
+                # httpx ignores the client's limits when given a transport, so the pool size goes here
+                transport=httpx.AsyncHTTPTransport(
+                    retries=1,
+                    limits=httpx.Limits(max_connections=OLLAMA_POOL_SIZE, max_keepalive_connections=OLLAMA_POOL_SIZE)
+                )
+            )
+            self.breakers[endpoint] = CircuitBreaker()
+        return self.clients[endpoint], self.breakers[endpoint]
+
+    def _record(self, breaker, response):
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    async def post(self, endpoint, path, **kwargs):
+        client, breaker = self._get(endpoint)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Upstream {endpoint} is unavailable (circuit open)")
+        try:
+            response = await client.post(path, **kwargs)
+        except httpx.RequestError:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # A client disconnect cancels the handler; the half-open trial must not stay claimed
+            breaker.release_trial()
+            raise
+        self._record(breaker, response)
+        return response
+
+    @asynccontextmanager
+    async def stream(self, endpoint, path, **kwargs):
+        """POST and yield the response with its body unread, for reading it as it arrives."""
+        client, breaker = self._get(endpoint)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Upstream {endpoint} is unavailable (circuit open)")
+        try:
+            async with client.stream('POST', path, **kwargs) as response:
+                self._record(breaker, response)
+                yield response
+        except httpx.RequestError:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.release_trial()
+            raise
+
+    async def aclose(self):
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients.clear()
+
+upstream = AsyncUpstreamClient()
+
+class LoopEvent:
+    """Stands in for the threading.Event that app.py's queues set, waking a coroutine instead of a thread.
+
+    set() may be called from any thread. Waiting this way holds no worker thread, so requests queued
+    for a model or scoring streams waiting for their next event cannot starve the default executor
+    that TTS, punctuation and the caches run on.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+        self.flag = False
+
+    def set(self):
+        self.flag = True
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.event.set)
+
+    def is_set(self):
+        return self.flag
+
+    async def wait(self, timeout=None):
+        """Return True once set, or False after timeout seconds."""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+@asynccontextmanager
+async def admitted(model, priority):
+    """Hold one of the model's admission slots, queueing on the event loop rather than a worker thread."""
+    ticket = admission.enqueue(model, priority, LoopEvent())
+    try:
+        await ticket["granted"].wait(OLLAMA_READ_TIMEOUT)
+    except asyncio.CancelledError:
+        admission.withdraw(ticket)
+        raise
+    slot = admission.claim(ticket)
+    try:
+        yield
+    finally:
+        admission.release(slot)
+
+@asynccontextmanager
+async def backend(model, fallback_endpoint):
+    """Async counterpart of app.BackendPool.acquire."""
+    endpoint = backend_pool.checkout(model, fallback_endpoint)
+    try:
+        yield endpoint
+    except (httpx.TransportError, httpx.TimeoutException, CircuitOpenError):
+        backend_pool.checkin(endpoint, model, succeeded=False, unreachable=True)
+        raise
+    except BaseException:
+        backend_pool.checkin(endpoint, model, succeeded=False)
+        raise
+    backend_pool.checkin(endpoint, model)
+
+async def handle_ollama_api(model, messages, endpoint):
+    """Call the Ollama API and return the response data."""
+    started = time.monotonic()
+    ollama_response = await upstream.post(
+        endpoint,
+        "/api/chat",
+        json={
+            "model": model,
+            "messages": messages,
+            "stream": False,
+            "keep_alive": OLLAMA_KEEP_ALIVE
+        }
+    )
+    if ollama_response.status_code != 200:
+        return None, f"Ollama API returned status code {ollama_response.status_code}"
+    response_data = ollama_response.json()
+    model_warmer.record(endpoint, model, time.monotonic() - started, response_data.get("load_duration", 0) / 1e9)
+    return response_data, None
+
+async def stream_ollama_api(model, messages, endpoint):
+    """Call the Ollama API in streaming mode and yield content tokens as they arrive."""
+    started = time.monotonic()
+    async with upstream.stream(
+        endpoint,
+        "/api/chat",
+        json={
+            "model": model,
+            "messages": messages,
+            "stream": True,
+            "keep_alive": OLLAMA_KEEP_ALIVE
+        }
+    ) as ollama_response:
+        if ollama_response.status_code != 200:
+            raise RuntimeError(f"Ollama API returned status code {ollama_response.status_code}")
+        async for line in ollama_response.aiter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise RuntimeError(chunk["error"])
+            token = chunk.get("message", {}).get("content", "")
+            if token:
+                yield token
+            if chunk.get("done"):
+                model_warmer.record(endpoint, model, time.monotonic() - started, chunk.get("load_duration", 0) / 1e9)
+                break
+        else:
+            raise RuntimeError("Ollama stream ended before the reply was done")
+
+async def cached_ollama_api(model, messages, endpoint, use_cache=True, priority=PRIORITY_INTERACTIVE):
+    """handle_ollama_api with the shared response cache and admission control in front of it."""
+    cached = await asyncio.to_thread(lookup_reply, model, messages) if use_cache else None
+    if cached is not None:
+        return {"message": {"role": "assistant", "content": cached}}, None
+    async with admitted(model, priority), backend(model, endpoint) as backend_endpoint:
+        response_data, error = await handle_ollama_api(model, messages, backend_endpoint)
+    if use_cache and not error:
+        await asyncio.to_thread(store_reply, model, messages, response_data["message"]["content"])
+    return response_data, error
+
+async def cached_stream_ollama_api(model, messages, endpoint, use_cache=True, priority=PRIORITY_INTERACTIVE):
+    """stream_ollama_api with the shared response cache and admission control in front of it.
+
+    A cache hit is yielded as a single token.
+    """
+    cached = await asyncio.to_thread(lookup_reply, model, messages) if use_cache else None
+    if cached is not None:
+        yield cached
+        return
+    tokens = []
+    async with admitted(model, priority), backend(model, endpoint) as backend_endpoint:
+        stream = stream_ollama_api(model, messages, backend_endpoint)
+        try:
+            async for token in stream:
+                tokens.append(token)
+                yield token
+        finally:
+            await stream.aclose()
+    if use_cache:
+        await asyncio.to_thread(store_reply, model, messages, ''.join(tokens))
+
+class ReplyStream:
+    """Reply tokens with the already pulled first token in front; aclose() ends the upstream stream.
+
+    A class rather than a generator, because an async generator that was never started skips its
+    finally blocks on aclose() and would keep holding its admission slot.
+    """
+
+    def __init__(self, first_token, stream):
+        self.first_token = first_token
+        self.stream = stream
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.first_token is not None:
+            token, self.first_token = self.first_token, None
+            return token
+        return await self.stream.__anext__()
+
+    async def aclose(self):
+        await self.stream.aclose()
+
+async def open_reply_stream(data, priority=None):
+    """Async counterpart of app.open_reply_stream; returns (chat request, async token iterator)."""
+    chat_request = await asyncio.to_thread(read_chat_request, data, priority)
+    stream = cached_stream_ollama_api(chat_request["model"], chat_request["messages"], chat_request["endpoint"],
+                                      chat_request["cache"], chat_request["priority"])
+    try:
+        first_token = await anext(stream, '')
+    except BaseException:
+        await stream.aclose()
+        raise
+    return chat_request, ReplyStream(first_token, stream)
+
+async def synthesize_while_streaming(tokens, **options):
+    """Async counterpart of app.synthesize_while_streaming: ('token', token) and ('audio', sentence, future)."""
+    pending = deque()
+    sentences = SentenceBuffer()
+
+    def submit(complete):
+        for sentence in complete:
+            pending.append((sentence, tts_executor.submit(synthesize_speech, sentence, **options)))
+
+    try:
+        async for token in tokens:
+            yield 'token', token
+            submit(sentences.feed(token))
+            while pending and pending[0][1].done():
+                yield ('audio',) + pending.popleft()
+        submit(sentences.flush())
+        while pending:
+            await asyncio.wait([asyncio.wrap_future(pending[0][1])])
+            yield ('audio',) + pending.popleft()
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+def chat_error_response(e):
+    if isinstance(e, httpx.TimeoutException):
+        print(f"Timeout calling Ollama API: {str(e)}")
+        return jsonify({"error": "Ollama did not respond in time", "details": str(e)}), 504
+    payload, status, headers = chat_error(e)
+    return jsonify(payload), status, headers
+
+def event_stream(body, mimetype='text/event-stream'):
+    response = Response(body, mimetype=mimetype, headers=STREAM_HEADERS)
+    # Replies and scoring can outlast Quart's default response timeout
+    response.timeout = None
+    return response
+
+@app.before_serving
+async def startup():
+    start_background_services()
+
+@app.after_serving
+async def shutdown():
+    await upstream.aclose()
+
+@app.route('/api/session', methods=['POST'])
+async def create_session():
+    data = await request.get_json(silent=True) or {}
+    session_id = conversations.create(data.get('system_prompt'), data.get('greeting'))
+    return jsonify({"session_id": session_id})
+
+@app.route('/api/session/<session_id>', methods=['DELETE'])
+async def delete_session(session_id):
+    conversations.delete(session_id)
+    return jsonify({"status": "ok"})
+
+@app.route('/api/chat', methods=['POST'])
+async def chat():
+    try:
+        chat_request = await asyncio.to_thread(read_chat_request, await request.get_json())
+        payload, status = chat_reply(chat_request, *await cached_ollama_api(
+            chat_request["model"], chat_request["messages"], chat_request["endpoint"],
+            chat_request["cache"], chat_request["priority"]))
+        return jsonify(payload), status
+    except Exception as e:
+        return chat_error_response(e)
+
+@app.route('/api/chat/stream', methods=['POST'])
+async def chat_stream():
+    try:
+        chat_request, stream = await open_reply_stream(await request.get_json())
+    except Exception as e:
+        return chat_error_response(e)
+
+    async def generate():
+        reply = ReplyEvents(chat_request)
+        try:
+            async for token in stream:
+                event = reply.token(token)
+                if event:
+                    yield event
+            yield reply.done()
+        except Exception as e:
+            yield reply.error(e)
+        finally:
+            await stream.aclose()
+
+    return event_stream(generate())
+
+@app.route('/api/turn', methods=['POST'])
+async def turn():
+    """Async counterpart of app.turn."""
+    data = await request.get_json()
+    tts_options = tts_params(data, request.accept_mimetypes)
+    del tts_options['text']
+    try:
+        chat_request, stream = await open_reply_stream(data, PRIORITY_INTERACTIVE)
+    except Exception as e:
+        return chat_error_response(e)
+
+    async def generate():
+        reply = ReplyEvents(chat_request)
+        try:
+            async for kind, *event in synthesize_while_streaming(stream, **tts_options):
+                sse = reply.token(*event) if kind == 'token' else reply.speech(*event)
+                if sse:
+                    yield sse
+            yield reply.done()
+        except Exception as e:
+            yield reply.error(e)
+        finally:
+            await stream.aclose()
+
+    return event_stream(generate())
+
+@app.route('/api/score', methods=['POST'])
+async def start_scoring():
+    try:
+        job_id = submit_scoring(await request.get_json())
+        return jsonify({"job_id": job_id, "status": "queued"}), 202
+    except Exception as e:
+        return chat_error_response(e)
+
+@app.route('/api/score/<job_id>', methods=['GET'])
+async def scoring_status(job_id):
+    payload, status = scoring_status_reply(job_id)
+    return jsonify(payload), status
+
+async def job_events(job, timeout=15):
+    """Async counterpart of ScoringJobs.events: yields the job's events, and None as a heartbeat while waiting."""
+    index = 0
+    while True:
+        changed = LoopEvent()
+        pending = scoring_jobs.watch(job, index, changed)
+        if not pending:
+            if not await changed.wait(timeout):
+                scoring_jobs.unwatch(job, changed)
+                yield None
+            continue
+        index += len(pending)
+        for event in pending:
+            yield event
+            if event["type"] in ("done", "error"):
+                return
+
+@app.route('/api/score/<job_id>/events', methods=['GET'])
+async def scoring_events(job_id):
+    job = scoring_jobs.get(job_id)
+    if job is None:
+        return jsonify(UNKNOWN_SCORING_JOB), 404
+
+    async def generate():
+        async for event in job_events(job):
+            yield scoring_event_line(event)
+
+    return event_stream(generate())
+
+@app.route('/api/punctuate', methods=['POST'])
+async def punctuate_text():
+    payload, status = await asyncio.to_thread(punctuation_reply, await request.get_json())
+    return jsonify(payload), status
+
+@app.route('/api/punctuate/batch', methods=['POST'])
+async def punctuate_batch():
+    payload, status = await asyncio.to_thread(punctuation_batch_reply, await request.get_json())
+    return jsonify(payload), status
+
+@app.websocket('/ws/punctuate')
+async def punctuate_socket():
+    """Async counterpart of app.punctuate_socket; each frame is handled by PunctuationSession.handle."""
+    session = PunctuationSession()
+    while True:
+        await websocket.send(await asyncio.to_thread(session.handle, await websocket.receive()))
+
+async def send_audio(audio, mimetype):
+    """Async counterpart of app.send_audio."""
+    response = await send_file(io.BytesIO(audio), mimetype=mimetype, add_etags=False,
+                               cache_timeout=TTS_AUDIO_MAX_AGE_SECONDS)
+    response.set_etag(audio_etag(audio))
+    await response.make_conditional(request, accept_ranges=True, complete_length=len(audio))
+    return vary_on_codec(response)
+
+@app.route('/api/tts', methods=['GET', 'POST'])
+async def text_to_speech():
+    try:
+        params, binary = read_tts_request(request.method, await request.get_json() if request.method == 'POST' else None,
+                                          request.args, request.accept_mimetypes)
+        # The TTS engines are blocking, so synthesis runs on a worker thread while the event loop carries on
+        audio, mimetype = await asyncio.to_thread(synthesize_speech, **params)
+        return await send_audio(audio, mimetype) if binary else jsonify(audio_payload(audio, mimetype))
+    except Exception as e:
+        return jsonify(tts_error(e)), 500
+
+@app.route('/api/tts/stream', methods=['POST'])
+async def text_to_speech_stream():
+    params = tts_params(await request.get_json(), request.accept_mimetypes)
+
+    async def generate():
+        pending = submit_sentences(**params)
+        try:
+            for index, (sentence, future) in enumerate(pending):
+                audio, mimetype = await asyncio.wrap_future(future)
+                yield json.dumps(audio_segment(index, sentence, audio, mimetype)) + '\n'
+        except Exception as e:
+            yield json.dumps(tts_error(e)) + '\n'
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    return event_stream(generate(), mimetype='application/x-ndjson')
+
+@app.route('/api/questions', methods=['GET'])
+async def question_bank():
+    payload, status = await asyncio.to_thread(question_bank_reply)
+    return jsonify(payload), status
+
+@app.route('/audio-pack/<path:filename>', methods=['GET'])
+async def audio_pack_file(filename):
+    response = await send_from_directory(AUDIO_PACK_DIR, filename)
+    response.headers['Cache-Control'] = AUDIO_PACK_CACHE_CONTROL
+    return response
+
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+    return jsonify({
+        "status": "ok",
+        "mode": "asgi",
+        "backends": backend_pool.status(),
+        "sessions": len(conversations)
+    })
+
+# Serve the frontend files
+@app.route('/', defaults={'path': ''})
+@app.route('/<path:path>')
+async def serve_static(path):
+    if path == "":
+        return await send_from_directory('static', 'index.html')
+    try:
+        return await send_from_directory('static', path)
+    except Exception:
+        return await send_from_directory('static', 'index.html')
+
+if __name__ == '__main__':
+    port = int(os.environ.get('PORT', 80))
+    app.run(host='0.0.0.0', port=port)
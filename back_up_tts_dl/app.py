@@ -5,9 +5,15 @@ import os
 import json
 import torch
 from TTS.api import TTS
+from TTS.tts.utils.synthesis import synthesis, trim_silence
+import numpy as np
 import io
 import base64
 import pyttsx3
+import queue
+import threading
+import time
+from concurrent.futures import Future
 
 
 os.environ["KMP_DUPLICATE_LIB_OK"]="TRUE"
@@ -17,19 +23,174 @@ app = Flask(__name__, static_folder='static')
 # Initialize TTS model
 device = "cuda" if torch.cuda.is_available() else "cpu"
 tts_model = None
+tts_ready = threading.Event()
+tts_load_finished = threading.Event()  # Set once loading has succeeded or failed
+tts_load_error = None
+tts_loader = None
+tts_loader_lock = threading.Lock()
+tts_timings = {"load_seconds": None, "warmup_seconds": None, "first_request_seconds": None}
+TTS_READY_TIMEOUT = float(os.environ.get('TTS_READY_TIMEOUT', 300))
 
-def initialize_tts():
-    global tts_model
-    if tts_model is None:
+def load_tts_model():
+    """Load the TTS model and run a dummy inference so the first real request runs warm."""
+    global tts_model, tts_load_error
+    try:
+        started = time.perf_counter()
         # Initialize the TTS model (using a simpler model for faster loading)
-        # tts_model = TTS("tts_models/en/ljspeech/speedy-speech").to(device)
-        tts_model = TTS("tts_models/en/ljspeech/tacotron2-DDC").to(device)
+        # model = TTS("tts_models/en/ljspeech/speedy-speech").to(device)
+        model = TTS("tts_models/en/ljspeech/tacotron2-DDC").to(device)
         # For better quality but slower, use XTTS v2:
-        # tts_model = TTS("tts_models/en/ljspeech/speedy-speech").to(device)
-        # tts_model = pyttsx3.init()
-        # tts_model.setProperty('rate', 125)
+        # model = TTS("tts_models/en/ljspeech/speedy-speech").to(device)
+        tts_timings["load_seconds"] = round(time.perf_counter() - started, 3)
+
+        # The first forward pass pays for allocator growth and kernel selection; do it now
+        started = time.perf_counter()
+        model.tts(text="Good morning. Let's begin the speaking test.")
+        tts_timings["warmup_seconds"] = round(time.perf_counter() - started, 3)
+
+        tts_model = model
+        tts_ready.set()
+        print(f"TTS model ready: {tts_timings}")
+    except Exception as e:
+        tts_load_error = str(e)
+        print(f"Error loading TTS model: {str(e)}")
+    finally:
+        tts_load_finished.set()
+
+def start_tts_loader():
+    """Start loading the model in the background, once per process."""
+    global tts_loader
+    with tts_loader_lock:
+        if tts_loader is None:
+            tts_loader = threading.Thread(target=load_tts_model, name="tts-loader", daemon=True)
+            tts_loader.start()
+
+def initialize_tts():
+    # Servers that never ran the __main__ block (flask run without the reloader, gunicorn) load on first use
+    start_tts_loader()
+    # Requests that arrive during startup wait for the background load instead of loading a second copy
+    if not tts_load_finished.wait(TTS_READY_TIMEOUT) or tts_model is None:
+        raise RuntimeError(tts_load_error or "TTS model is still loading")
     return tts_model
 
+TTS_BATCH_MAX_SIZE = int(os.environ.get('TTS_BATCH_MAX_SIZE', 8))
+TTS_BATCH_MAX_WAIT_MS = float(os.environ.get('TTS_BATCH_MAX_WAIT_MS', 10))
+# Coqui's Synthesizer pads each sentence with this many zero samples
+SENTENCE_SILENCE_SAMPLES = 10000
+
+class MicroBatcher:
+    """Collects concurrent requests for a few milliseconds and runs them through one batch call.
+
+    run_batch returns one result per item; an exception in place of a result fails only that item.
+    """
+
+    def __init__(self, run_batch, max_batch_size, max_wait_seconds):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.queue = queue.Queue()
+        self.stats = {"batches": 0, "items": 0, "max_batch_size": 0}
+        threading.Thread(target=self._loop, name="tts-batcher", daemon=True).start()
+
+    def submit(self, item):
+        """Block until the item's batch has run and return its result."""
+        future = Future()
+        self.queue.put((item, future))
+        return future.result()
+
+    def _loop(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_wait_seconds
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self.stats["batches"] += 1
+            self.stats["items"] += len(batch)
+            self.stats["max_batch_size"] = max(self.stats["max_batch_size"], len(batch))
+            try:
+                results = self.run_batch([item for item, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+def synthesize_each(tts, texts):
+    """Synthesize the texts one at a time, returning a failing text's exception as its result."""
+    results = []
+    for text in texts:
+        try:
+            results.append(tts.tts(text=text))
+        except Exception as e:
+            results.append(e)
+    return results
+
+def synthesize_batch(texts):
+    """Synthesize several texts, sharing one batched vocoder pass across all of their sentences.
+
+    Tacotron2's decoder stops on a single stop token, so it cannot decode a padded batch; each
+    sentence is decoded on its own, and the mel spectrograms are then padded and vocoded together.
+    """
+    tts = initialize_tts()
+    synthesizer = tts.synthesizer
+    if (synthesizer.vocoder_model is None
+            or synthesizer.vocoder_config["audio"]["sample_rate"] != synthesizer.tts_model.ap.sample_rate):
+        return synthesize_each(tts, texts)
+
+    try:
+        with torch.inference_mode():
+            owners, mels = [], []
+            for index, text in enumerate(texts):
+                for sentence in synthesizer.split_into_sentences(text):
+                    outputs = synthesis(
+                        model=synthesizer.tts_model,
+                        text=sentence,
+                        CONFIG=synthesizer.tts_config,
+                        use_cuda=device == "cuda",
+                        use_griffin_lim=False
+                    )
+                    mel = outputs["outputs"]["model_outputs"][0].detach().cpu().numpy()
+                    mel = synthesizer.tts_model.ap.denormalize(mel.T)
+                    owners.append(index)
+                    mels.append(synthesizer.vocoder_ap.normalize(mel))
+
+            # [B, C, T] batch padded with the quietest value seen, trimmed again after vocoding
+            lengths = [mel.shape[1] for mel in mels]
+            pad_value = min(mel.min() for mel in mels)
+            batch = np.full((len(mels), mels[0].shape[0], max(lengths)), pad_value, dtype=np.float32)
+            for i, mel in enumerate(mels):
+                batch[i, :, :mel.shape[1]] = mel
+            waveforms = synthesizer.vocoder_model.inference(torch.from_numpy(batch).to(device))
+            waveforms = waveforms.squeeze(1).cpu().numpy()
+
+        hop_length = synthesizer.vocoder_ap.hop_length
+        # Synthesizer.tts trims trailing silence when the model config asks for it; match it exactly
+        audio_config = synthesizer.tts_config.audio
+        trim = "do_trim_silence" in audio_config and audio_config["do_trim_silence"]
+        results = [[] for _ in texts]
+        for owner, length, waveform in zip(owners, lengths, waveforms):
+            waveform = waveform[:length * hop_length]
+            if trim:
+                waveform = trim_silence(waveform, synthesizer.tts_model.ap)
+            results[owner].extend(waveform.tolist())
+            results[owner].extend([0] * SENTENCE_SILENCE_SAMPLES)
+        return results
+    except Exception as e:
+        print(f"Batched TTS failed, synthesizing one at a time: {str(e)}")
+        return synthesize_each(tts, texts)
+
+tts_batcher = MicroBatcher(synthesize_batch, TTS_BATCH_MAX_SIZE, TTS_BATCH_MAX_WAIT_MS / 1000)
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     try:
@@ -71,8 +232,9 @@ def text_to_speech():
         data = request.json
         text = data.get('text', '')
         voice = data.get('voice', 'default')
+        started = time.perf_counter()
         
-        # Initialize TTS if not already done
+        # Wait for the model if it is still loading
         tts = initialize_tts()
         
         # Create a memory buffer for the audio
@@ -92,8 +254,8 @@ def text_to_speech():
                 file_path=audio_buffer
             )
         else:
-            # For regular TTS models
-            wav = tts.tts(text=text)
+            # For regular TTS models; concurrent requests are batched together
+            wav = tts_batcher.submit(text)
             # Save wav to buffer
             tts.synthesizer.save_wav(wav, audio_buffer)
 
@@ -104,6 +266,9 @@ def text_to_speech():
         audio_buffer.seek(0)
         audio_data = base64.b64encode(audio_buffer.read()).decode('utf-8')
         
+        if tts_timings["first_request_seconds"] is None:
+            tts_timings["first_request_seconds"] = round(time.perf_counter() - started, 3)
+        
         return jsonify({
             "audio": audio_data
         })
@@ -119,6 +284,16 @@ def text_to_speech():
 def health_check():
     return jsonify({"status": "ok"})
 
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    ready = tts_ready.is_set()
+    return jsonify({
+        "ready": ready,
+        "error": tts_load_error,
+        "timings": tts_timings,
+        "batching": tts_batcher.stats
+    }), 200 if ready else 503
+
 # Serve the frontend files
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -134,4 +309,7 @@ if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     # Create a voices directory if it doesn't exist
     os.makedirs('static/voices', exist_ok=True)
+    # The debug reloader runs this block in a watcher process too; only the serving child loads the model
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_tts_loader()
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
@@ -7,39 +7,115 @@ import io
 import base64
 import pyttsx3
 import tempfile
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 app = Flask(__name__, static_folder='static')
 
-# Initialize pyttsx3 engine
-tts_engine = None
+TTS_WORKER_PROCESSES = int(os.environ.get('TTS_WORKER_PROCESSES', 2))
+# Write synthesized audio to RAM-backed storage where the OS has it, so no disk I/O is involved
+AUDIO_SCRATCH_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+# Each worker process owns its own pyttsx3 engine; engines are not safe to share between threads
+worker_engine = None
+
+def init_worker():
+    global worker_engine
+    worker_engine = pyttsx3.init()
+    # Configure properties
+    worker_engine.setProperty('rate', 150)  # Speed of speech
+    worker_engine.setProperty('volume', 0.8)  # Volume (0.0 to 1.0)
+
+def list_voices_in_worker():
+    return [
+        {'name': voice.name, 'languages': voice.languages, 'system_id': voice.id}
+        for voice in worker_engine.getProperty('voices')
+    ]
+
+def synthesize_in_worker(text, system_voice_id):
+    if system_voice_id is not None:
+        worker_engine.setProperty('voice', system_voice_id)
+    path = os.path.join(AUDIO_SCRATCH_DIR, f"ielts-tts-{uuid.uuid4().hex}.wav")
+    try:
+        worker_engine.save_to_file(text, path)
+        worker_engine.runAndWait()
+        with open(path, 'rb') as audio_file:
+            return audio_file.read()
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+
+class VoiceCatalog:
+    """Installed voices, scanned once and indexed by id and gender."""
+
+    def __init__(self, voices):
+        self.voices = []
+        self.by_gender = {}
+        for i, voice in enumerate(voices):
+            gender = 'female' if 'female' in voice['name'].lower() else 'male'
+            entry = {
+                'id': i,  # Use index as ID for easy reference
+                'name': voice['name'],
+                'languages': voice['languages'],
+                'gender': gender,
+                'system_id': voice['system_id']  # The actual system ID of the voice
+            }
+            self.voices.append(entry)
+            self.by_gender.setdefault(gender, entry['system_id'])
+
+    def resolve(self, voice_id=None, gender=None):
+        """Return the system voice id for a catalog index or gender, or None for the engine default."""
+        if voice_id is not None and 0 <= voice_id < len(self.voices):
+            return self.voices[voice_id]['system_id']
+        if gender == 'female':
+            return self.by_gender.get('female')
+        return self.by_gender.get('male')
+
+tts_pool = None
+voice_catalog = None
+tts_pool_lock = threading.Lock()
 
 def initialize_tts():
-    global tts_engine
-    if tts_engine is None:
-        tts_engine = pyttsx3.init()
-        # Configure properties
-        tts_engine.setProperty('rate', 150)  # Speed of speech
-        tts_engine.setProperty('volume', 0.8)  # Volume (0.0 to 1.0)
-    return tts_engine
+    global tts_pool, voice_catalog
+    with tts_pool_lock:
+        if tts_pool is None:
+            pool = ProcessPoolExecutor(max_workers=TTS_WORKER_PROCESSES, initializer=init_worker)
+            try:
+                voice_catalog = VoiceCatalog(pool.submit(list_voices_in_worker).result())
+            except Exception:
+                pool.shutdown(wait=False)
+                raise
+            tts_pool = pool
+    return tts_pool, voice_catalog
+
+def synthesize_in_pool(text, system_voice_id):
+    """Synthesize on a worker process, replacing the pool and retrying once if a worker has died.
+
+    A dead worker breaks the whole ProcessPoolExecutor; every later submit to it would fail.
+    """
+    global tts_pool
+    for attempt in range(2):
+        pool, _ = initialize_tts()
+        try:
+            return pool.submit(synthesize_in_worker, text, system_voice_id).result()
+        except BrokenProcessPool as e:
+            print(f"TTS worker pool broke, restarting it: {str(e)}")
+            with tts_pool_lock:
+                if tts_pool is pool:
+                    tts_pool = None
+            pool.shutdown(wait=False)
+            if attempt:
+                raise
 
 @app.route('/api/voices', methods=['GET'])
 def get_available_voices():
     """Return a list of all available voices on the system"""
-    tts = initialize_tts()
-    voices = tts.getProperty('voices')
-    
-    voice_list = []
-    for i, voice in enumerate(voices):
-        voice_list.append({
-            'id': i,  # Use index as ID for easy reference
-            'name': voice.name,
-            'languages': voice.languages,
-            'gender': 'female' if 'female' in voice.name.lower() else 'male',
-            'system_id': voice.id  # The actual system ID of the voice
-        })
+    _, catalog = initialize_tts()
     
     return jsonify({
-        "voices": voice_list
+        "voices": catalog.voices
     })
 
 @app.route('/api/chat', methods=['POST'])
@@ -85,39 +161,11 @@ def text_to_speech():
         voice_id = data.get('voice_id')  # Accept a specific voice ID
         voice_gender = data.get('voice', 'default')  # For backward compatibility
         
-        # Initialize TTS if not already done
-        tts = initialize_tts()
-        voices = tts.getProperty('voices')
-        
-        # Set voice based on parameters
-        if voice_id is not None and 0 <= voice_id < len(voices):
-            # If a specific voice ID is provided, use that
-            tts.setProperty('voice', voices[voice_id].id)
-        elif voice_gender == "female":
-            # Try to find a female voice
-            female_voices = [v for v in voices if "female" in v.name.lower()]
-            if female_voices:
-                tts.setProperty('voice', female_voices[0].id)
-        else:
-            # Default to a male voice if available
-            male_voices = [v for v in voices if "male" in v.name.lower()]
-            if male_voices:
-                tts.setProperty('voice', male_voices[0].id)
-        
-        # Use a temporary file
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-            temp_filename = temp_file.name
-            
-        # Save speech to the temporary file
-        tts.save_to_file(text, temp_filename)
-        tts.runAndWait()
-        
-        # Read the temporary file into memory
-        with open(temp_filename, 'rb') as audio_file:
-            audio_data = base64.b64encode(audio_file.read()).decode('utf-8')
-        
-        # Clean up the temporary file
-        os.unlink(temp_filename)
+        # Synthesize on a worker process so concurrent requests run in parallel
+        _, catalog = initialize_tts()
+        system_voice_id = catalog.resolve(voice_id, voice_gender)
+        audio = synthesize_in_pool(text, system_voice_id)
+        audio_data = base64.b64encode(audio).decode('utf-8')
         
         return jsonify({
             "audio": audio_data
@@ -0,0 +1,87 @@
+# bench_punctuation.py - Micro-benchmark for the transcript punctuator
+#
+# Usage: python bench_punctuation.py [max_words]
+# Times punctuator.add_punctuation() on synthetic unpunctuated ASR transcripts of growing length,
+# next to the regex cascade it replaced, and checks that both produce the same text.
+import random
+import re
+import sys
+import time
+
+from app import punctuator
+
+VOCABULARY = (
+    "i think that my hometown is quite nice and the people are friendly but sometimes it is crowded "
+    "so i prefer to stay at home what do you think about it however i like travelling for example "
+    "to the mountains in addition i enjoy reading as a result i know a lot about History and Science "
+    "why do people move to big cities where there are more jobs or maybe better schools"
+).split()
+
+class CascadePunctuator:
+    """The regex cascade the punctuator used before, kept as the baseline."""
+
+    def __init__(self):
+        self.sentence_endings = r'([.!?])\s+'
+        self.comma_patterns = [
+            r'(,)\s+',
+            r'\b(but|and|or|nor|for|so|yet)\b',
+            r'\b(however|moreover|furthermore|therefore|nevertheless|meanwhile|consequently)\b',
+            r'\b(in addition|as a result|for example|for instance)\b',
+        ]
+
+    def capitalize_sentences(self, text):
+        sentences = re.split(self.sentence_endings, text)
+        result = []
+        for i in range(0, len(sentences), 2):
+            if i < len(sentences):
+                sentence = sentences[i].strip()
+                if sentence:
+                    sentence = sentence[0].upper() + sentence[1:] if len(sentence) > 1 else sentence.upper()
+                    result.append(sentence)
+                if i + 1 < len(sentences):
+                    result.append(sentences[i + 1])
+        return ' '.join(result)
+
+    def add_punctuation(self, text):
+        text = ' '.join(text.split())
+        text = re.sub(r'(?<=[.!?])\s+', ' ', text)
+        text = re.sub(r'(?<=[a-z])\s+(?=[A-Z])', '. ', text)
+        text = re.sub(r'\b(what|who|where|when|why|how|which|whose|whom)\b.*?(?=[.!?]|\Z)',
+                      lambda m: m.group(0) + '?', text, flags=re.IGNORECASE)
+        for pattern in self.comma_patterns:
+            text = re.sub(f'\\s+{pattern}\\s+', r', \1 ', text)
+        text = re.sub(r'\s+([.!?,])', r'\1', text)
+        text = re.sub(r'([.!?,])', r'\1 ', text)
+        text = re.sub(r'\s+', ' ', text)
+        text = self.capitalize_sentences(text)
+        return text.strip()
+
+def transcript(words, seed=0):
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(words))
+
+def best_time(function, text, budget_seconds=0.5):
+    """Best per-call time over repeated runs within roughly the time budget."""
+    best = float('inf')
+    deadline = time.perf_counter() + budget_seconds
+    while True:
+        start = time.perf_counter()
+        function(text)
+        best = min(best, time.perf_counter() - start)
+        if time.perf_counter() > deadline:
+            return best
+
+if __name__ == '__main__':
+    max_words = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    cascade = CascadePunctuator()
+    print(f"{'words':>8} {'engine ms':>10} {'cascade ms':>11} {'speedup':>8} {'engine us/word':>15}")
+    words = 25
+    while words <= max_words:
+        text = transcript(words)
+        if punctuator.add_punctuation(text) != cascade.add_punctuation(text):
+            sys.exit(f"Output differs from the cascade on a {words}-word transcript")
+        engine = best_time(punctuator.add_punctuation, text)
+        baseline = best_time(cascade.add_punctuation, text)
+        print(f"{words:>8} {engine * 1e3:>10.3f} {baseline * 1e3:>11.3f} {baseline / engine:>7.2f}x "
+              f"{engine * 1e6 / words:>15.3f}")
+        words *= 4
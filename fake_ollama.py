@@ -0,0 +1,99 @@
+# fake_ollama.py - Minimal stand-in for the Ollama HTTP API, for local testing without a GPU
+#
+# Usage: python fake_ollama.py [port]
+# Then point the app's Ollama endpoint at http://localhost:<port> (default 11435).
+import json
+import os
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKEN_DELAY = float(os.environ.get('FAKE_OLLAMA_TOKEN_DELAY', 0.05))
+LOAD_SECONDS = float(os.environ.get('FAKE_OLLAMA_LOAD_SECONDS', 2.0))
+REPLY = os.environ.get(
+    'FAKE_OLLAMA_REPLY',
+    "Thank you. That's interesting. Could you tell me a little more about it?"
+)
+
+loaded_models = set()
+
+def load_model(model):
+    """Simulate Ollama loading a model on first use; returns the load duration in nanoseconds."""
+    if model in loaded_models:
+        return 0
+    time.sleep(LOAD_SECONDS)
+    loaded_models.add(model)
+    return int(LOAD_SECONDS * 1e9)
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._send_json({"models": [{"name": "gemma3:12b", "model": "gemma3:12b"}]})
+        elif self.path == '/api/ps':
+            self._send_json({"models": [{"name": model, "model": model} for model in sorted(loaded_models)]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if self.path == '/api/generate':
+            data = self._read_json()
+            model = data.get('model', 'gemma3:12b')
+            self._send_json({"model": model, "response": "", "done": True, "load_duration": load_model(model)})
+            return
+        if self.path != '/api/chat':
+            self._send_json({"error": "not found"}, 404)
+            return
+
+        data = self._read_json()
+        model = data.get('model', 'gemma3:12b')
+        load_duration = load_model(model)
+        tokens = [word + ' ' for word in REPLY.split(' ')]
+        tokens[-1] = tokens[-1].rstrip()
+
+        if not data.get('stream', True):
+            time.sleep(TOKEN_DELAY * len(tokens))
+            self._send_json({
+                "model": model,
+                "message": {"role": "assistant", "content": ''.join(tokens)},
+                "done": True,
+                "load_duration": load_duration
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for token in tokens + [None]:
+            if token is None:
+                chunk = {"model": model, "message": {"role": "assistant", "content": ""}, "done": True,
+                         "load_duration": load_duration}
+            else:
+                time.sleep(TOKEN_DELAY)
+                chunk = {"model": model, "message": {"role": "assistant", "content": token}, "done": False}
+            line = (json.dumps(chunk) + '\n').encode('utf-8')
+            self.wfile.write(f"{len(line):x}\r\n".encode('ascii') + line + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        pass
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 11435
+    print(f"Fake Ollama listening on http://localhost:{port}")
+    ThreadingHTTPServer(('0.0.0.0', port), FakeOllamaHandler).serve_forever()
@@ -0,0 +1,208 @@
+# punctuation_model.py - Statistical punctuation and casing model for ASR transcripts
+#
+# Train offline from a plain-text corpus (any punctuated English prose, one or many files):
+#     python punctuation_model.py train corpus.txt [more.txt ...] --out punctuation_model
+# Try it:
+#     python punctuation_model.py punctuate punctuation_model "so what do you do i work in a bank"
+#
+# The model predicts the mark in each gap between words (none, comma, period, question mark) from
+# word-pair and single-word n-gram counts, picks the best sequence of marks with a Viterbi pass over
+# mark-to-mark transitions, and restores each word's usual casing. All tables are plain .npy arrays
+# loaded memory-mapped, so loading is instant and the pages are shared between worker processes.
+import argparse
+import os
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+MARKS = ('', ',', '.', '?')
+NONE, COMMA, PERIOD, QUESTION = range(len(MARKS))
+SENTENCE_END = np.array([False, False, True, True])
+
+MAX_WORD_LENGTH = 32
+
+TOKEN = re.compile(r"[A-Za-z0-9]+(?:['’][A-Za-z]+)*|[.,;:!?]")
+WORD = re.compile(r"[^\W_]+(?:['’][^\W_]+)*")
+# Corpus punctuation folded onto the marks the model predicts
+MARK_OF = {',': COMMA, ';': COMMA, ':': COMMA, '.': PERIOD, '!': PERIOD, '?': QUESTION}
+
+TABLES = ('vocab', 'surface', 'after', 'before', 'pair_keys', 'pair_marks', 'transitions', 'prior')
+
+class BudgetExceededError(TimeoutError):
+    """Raised when decoding runs past the caller's deadline."""
+
+def corpus_sentences(paths):
+    """Yield (word, mark following it) pairs per line of the corpus files."""
+    for path in paths:
+        with open(path, encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                tokens = TOKEN.findall(line)
+                pairs = []
+                for token in tokens:
+                    if token in MARK_OF:
+                        if pairs:
+                            pairs[-1][1] = max(pairs[-1][1], MARK_OF[token])
+                    else:
+                        pairs.append([token, NONE])
+                if pairs:
+                    yield pairs
+
+def log_normalize(counts, smoothing):
+    counts = counts.astype(np.float64) + smoothing
+    return np.log(counts / counts.sum(axis=-1, keepdims=True)).astype(np.float32)
+
+def train(paths, out_dir, max_vocab=50000, min_count=2, min_pair_count=3, smoothing=0.5):
+    """Count the corpus and write the model tables to out_dir."""
+    word_counts = Counter()
+    surfaces = defaultdict(Counter)
+    sentences = []
+    for pairs in corpus_sentences(paths):
+        sentences.append(pairs)
+        sentence_start = True
+        for word, mark in pairs:
+            lower = word.lower()
+            word_counts[lower] += 1
+            if not sentence_start:
+                surfaces[lower][word] += 1
+            sentence_start = SENTENCE_END[mark]
+
+    # Sorted as UTF-8 bytes, which is the order np.searchsorted sees in the byte-string vocab table
+    words = sorted(word for word, count in word_counts.most_common(max_vocab)
+                   if count >= min_count and len(word.encode('utf-8')) <= MAX_WORD_LENGTH)
+    index = {word: i for i, word in enumerate(words)}
+    unknown = len(words)
+
+    after = np.zeros((unknown + 1, len(MARKS)), dtype=np.int64)
+    before = np.zeros((unknown + 1, len(MARKS)), dtype=np.int64)
+    transitions = np.zeros((len(MARKS), len(MARKS)), dtype=np.int64)
+    pair_counts = defaultdict(lambda: np.zeros(len(MARKS), dtype=np.int64))
+    for pairs in sentences:
+        ids = [index.get(word.lower(), unknown) for word, _ in pairs]
+        previous = PERIOD
+        for position, (word_id, (_, mark)) in enumerate(zip(ids, pairs)):
+            after[word_id, mark] += 1
+            transitions[previous, mark] += 1
+            previous = mark
+            if position + 1 < len(ids):
+                before[ids[position + 1], mark] += 1
+                pair_counts[word_id * (unknown + 1) + ids[position + 1]][mark] += 1
+
+    pair_keys = np.array(sorted(key for key, counts in pair_counts.items() if counts.sum() >= min_pair_count),
+                         dtype=np.int64)
+    pair_marks = np.array([pair_counts[key] for key in pair_keys], dtype=np.int64).reshape(-1, len(MARKS))
+    surface = [surfaces[word].most_common(1)[0][0] if surfaces[word] else word for word in words]
+
+    os.makedirs(out_dir, exist_ok=True)
+    tables = {
+        'vocab': np.array([word.encode('utf-8') for word in words], dtype=bytes),
+        'surface': np.array([word.encode('utf-8') for word in surface], dtype=bytes),
+        'after': log_normalize(after, smoothing),
+        'before': log_normalize(before, smoothing),
+        'pair_keys': pair_keys,
+        'pair_marks': log_normalize(pair_marks, smoothing),
+        'transitions': log_normalize(transitions, smoothing),
+        'prior': log_normalize(after.sum(axis=0), smoothing)
+    }
+    for name, table in tables.items():
+        np.save(os.path.join(out_dir, f'{name}.npy'), table)
+    return {"sentences": len(sentences), "vocabulary": len(words), "pairs": len(pair_keys)}
+
+class NgramPunctuator:
+    """Punctuates and truecases text with tables written by train()."""
+
+    def __init__(self, model_dir):
+        for name in TABLES:
+            setattr(self, name, np.load(os.path.join(model_dir, f'{name}.npy'), mmap_mode='r'))
+        self.unknown = len(self.vocab)
+        # The per-word loop touches these tiny tables every step; keep them out of the mapping
+        self.transitions = np.array(self.transitions)
+        self.prior = np.array(self.prior)
+
+    def _ids(self, words):
+        """Vocabulary ids of the words (the unknown id for out-of-vocabulary ones), by binary search."""
+        lower = np.array([word.lower().encode('utf-8') for word in words], dtype=bytes)
+        if not self.unknown:
+            return np.full(len(words), self.unknown, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.vocab, lower), self.unknown - 1)
+        return np.where(self.vocab[positions] == lower, positions, self.unknown)
+
+    def _gap_scores(self, ids):
+        """Log-scores of each mark in every gap: word-pair statistics where seen, else the two single words."""
+        scores = np.empty((len(ids), len(MARKS)), dtype=np.float32)
+        scores[:-1] = self.after[ids[:-1]] + self.before[ids[1:]] - self.prior
+        if len(self.pair_keys) and len(ids) > 1:
+            keys = ids[:-1] * (self.unknown + 1) + ids[1:]
+            positions = np.minimum(np.searchsorted(self.pair_keys, keys), len(self.pair_keys) - 1)
+            seen = self.pair_keys[positions] == keys
+            scores[:-1][seen] = self.pair_marks[positions[seen]]
+        # The transcript always ends a sentence
+        scores[-1] = np.where(SENTENCE_END, self.after[ids[-1]], -np.inf)
+        return scores
+
+    def _viterbi(self, scores, deadline):
+        count = len(scores)
+        transitions = self.transitions
+        states = np.arange(len(MARKS))
+        backpointers = np.empty((count, len(MARKS)), dtype=np.intp)
+        best = transitions[PERIOD] + scores[0]
+        for position in range(1, count):
+            if deadline is not None and position % 64 == 0 and time.monotonic() > deadline:
+                raise BudgetExceededError(f"Punctuation budget exceeded after {position} of {count} words")
+            # All previous-mark x next-mark candidates at once
+            candidates = best[:, None] + transitions
+            previous = candidates.argmax(axis=0)
+            backpointers[position] = previous
+            best = candidates[previous, states] + scores[position]
+        marks = np.empty(count, dtype=np.intp)
+        marks[-1] = best.argmax()
+        for position in range(count - 1, 0, -1):
+            marks[position - 1] = backpointers[position, marks[position]]
+        return marks
+
+    def add_punctuation(self, text, deadline=None):
+        """Return the text re-punctuated and truecased; raises BudgetExceededError past `deadline` (monotonic)."""
+        words = WORD.findall(text)
+        if not words:
+            return text.strip()
+        ids = self._ids(words)
+        marks = self._viterbi(self._gap_scores(ids), deadline)
+        # Known words take their usual written form; unknown ones stay as heard
+        in_vocab = ids < self.unknown
+        surfaces = self.surface[np.where(in_vocab, ids, 0)].tolist() if in_vocab.any() else words
+        cased = [surface.decode('utf-8') if known else word
+                 for word, known, surface in zip(words, in_vocab.tolist(), surfaces)]
+
+        output = []
+        sentence_start = True
+        for word, mark in zip(cased, marks.tolist()):
+            if sentence_start:
+                word = word[0].upper() + word[1:]
+            output.append(word + MARKS[mark])
+            sentence_start = SENTENCE_END[mark]
+        return ' '.join(output)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train or run the statistical punctuation model.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    train_parser = commands.add_parser('train', help='Build model tables from a punctuated text corpus.')
+    train_parser.add_argument('corpus', nargs='+')
+    train_parser.add_argument('--out', default='punctuation_model')
+    train_parser.add_argument('--max-vocab', type=int, default=50000)
+    train_parser.add_argument('--min-count', type=int, default=2)
+    punctuate_parser = commands.add_parser('punctuate', help='Punctuate text with a trained model.')
+    punctuate_parser.add_argument('model_dir')
+    punctuate_parser.add_argument('text')
+    args = parser.parse_args(argv)
+
+    if args.command == 'train':
+        stats = train(args.corpus, args.out, max_vocab=args.max_vocab, min_count=args.min_count)
+        print(f"Trained on {stats['sentences']} lines: {stats['vocabulary']} words, "
+              f"{stats['pairs']} word pairs -> {args.out}")
+    else:
+        print(NgramPunctuator(args.model_dir).add_punctuation(args.text))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,63 +13,9 @@ let config = {
     recognition: null,
     currentAudio: null,  // Track current playing audio
     messageSent: false,  // Flag to track if a message has been sent
-    testPrompts: {
-        systemPrompt: `You are an IELTS speaking examiner. You should evaluate the student's English speaking ability 
-                      according to the IELTS criteria: Fluency and Coherence, Lexical Resource, Grammatical Range 
-                      and Accuracy, and Pronunciation. Keep your responses concise and natural like a real examiner. 
-                      Do not provide scores during the test, only at the end when explicitly asked.`,
-        scoringPrompt: `Please analyze my complete speaking performance throughout this conversation and provide IELTS scores for:
-                      1. Fluency and Coherence: Evaluate logical flow, topic development, and coherence of ideas.
-                      2. Lexical Resource: Assess vocabulary range, appropriateness, and accuracy.
-                      3. Grammatical Range and Accuracy: Judge grammatical structures and correctness.
-                      4. Pronunciation: While you cannot hear my pronunciation directly, try to evaluate based on my choice of words and any metadata about my speech.
-                      
-                      Provide a score out of 9 for each category and an overall band score, with detailed feedback.`,
-        part1: {
-            intro: "Good morning/afternoon. My name is Aditi. Can you tell me your full name, please? Now, I'd like to ask you some questions about yourself.",
-            topics: [
-                "Can you describe your hometown?",
-                "Do you work or are you a student?",
-                "What do you enjoy doing in your free time?",
-                "Do you prefer indoor or outdoor activities?",
-                "What kind of music do you like to listen to?",
-                "Do you enjoy cooking?"
-            ]
-        },
-        part2: {
-            intro: "I'm going to give you a topic and I'd like you to talk about it for 1 to 2 minutes. Before you start, you'll have one minute to prepare. Here's some paper and a pencil for making notes if you wish.",
-            topics: [
-                "Describe a book you have recently read. You should say: what kind of book it is, what it is about, why you decided to read it, and explain why you liked or disliked it.",
-                "Describe a place you have visited that made a strong impression on you. You should say: where it is, when you went there, what you did there, and explain why it made such a strong impression on you.",
-                "Describe a skill you would like to learn. You should say: what the skill is, how you would learn it, how long it would take to learn, and explain why you want to learn this skill."
-            ]
-        },
-        part3: {
-            intro: "Now let's discuss some more general questions related to this topic.",
-            topics: {
-                "books": [
-                    "How have reading habits changed in your country in recent years?",
-                    "Do you think digital books will eventually replace printed books?",
-                    "What kinds of books are most popular in your country?",
-                    "How important is reading for a child's development?"
-                ],
-                "places": [
-                    "What types of places do people from your country like to visit on vacation?",
-                    "How has tourism changed in your country over the last few decades?",
-                    "Do you think it's better to travel independently or as part of a tour group?",
-                    "How might tourism affect local communities?"
-                ],
-                "skills": [
-                    "Why do you think some people are reluctant to learn new skills?",
-                    "How has technology changed the way people learn new skills?",
-                    "What skills do you think will be most important in the future?",
-                    "Should schools focus more on practical skills rather than academic knowledge?"
-                ]
-            }
-        },
-        conclusion: "Thank you. That's the end of the speaking test."
-    },
-    speechMetadata: []
+    sessionPromise: null,  // Resolves to the server-side conversation session id
+    audioCodec: new Audio().canPlayType('audio/ogg; codecs="opus"') ? 'opus' : 'mp3',  // Compact speech codec for TTS
+    questionBank: null  // Resolves to the question bank (and its prebuilt audio) from /api/questions
 };
 
 // DOM Elements
@@ -94,8 +40,27 @@ document.addEventListener('DOMContentLoaded', () => {
     initializeSpeechRecognition();
     attachEventListeners();
     loadSettings();
+    loadQuestionBank().catch(error => console.error('Error loading question bank:', error));
 });
 
+// The question bank lives on the server, together with the URLs of its pre-rendered audio
+function loadQuestionBank() {
+    if (!config.questionBank) {
+        config.questionBank = fetch('/api/questions')
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP error! Status: ${response.status}`);
+                }
+                return response.json();
+            })
+            .catch(error => {
+                config.questionBank = null;
+                throw error;
+            });
+    }
+    return config.questionBank;
+}
+
 // Punctuation handling function
 async function processPunctuation(text) {
     try {
@@ -121,6 +86,79 @@ async function processPunctuation(text) {
     }
 }
 
+// Punctuate several final recognition segments in one request; the server memoizes each segment
+async function punctuateSegments(segments) {
+    try {
+        const response = await fetch('/api/punctuate/batch', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                segments: segments
+            })
+        });
+
+        if (!response.ok) {
+            throw new Error(`HTTP error! Status: ${response.status}`);
+        }
+
+        const data = await response.json();
+        return data.segments;
+    } catch (error) {
+        console.error('Error processing punctuation:', error);
+        return segments; // Return original segments if there's an error
+    }
+}
+
+// Live punctuation over a WebSocket: each recognizer event goes out as one small frame and only the
+// changed span of the punctuated transcript comes back
+function openPunctuationSocket(onSpan) {
+    if (!('WebSocket' in window)) {
+        return null;
+    }
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const socket = new WebSocket(`${protocol}//${window.location.host}/ws/punctuate`);
+    const SETTLE_TIMEOUT_MS = 2000; // Stop waiting on a socket that stays open but has stopped answering
+    let pending = 0;
+    let waiters = [];
+    
+    const settle = () => {
+        waiters.forEach(resolve => resolve());
+        waiters = [];
+    };
+    
+    socket.onmessage = (message) => {
+        pending = Math.max(0, pending - 1);
+        const span = JSON.parse(message.data);
+        if (span.error) {
+            console.error('Error processing punctuation:', span.error);
+        } else {
+            onSpan(span);
+        }
+        if (pending === 0) settle();
+    };
+    socket.onclose = () => {
+        pending = 0;
+        settle();
+    };
+    socket.onerror = () => console.error('Punctuation socket failed; using HTTP punctuation');
+    
+    return {
+        isOpen: () => socket.readyState === WebSocket.OPEN,
+        send(payload) {
+            pending++;
+            socket.send(JSON.stringify(payload));
+        },
+        // Resolves once every sent update has been answered, or after SETTLE_TIMEOUT_MS at the latest
+        settled: () => pending === 0 ? Promise.resolve() : Promise.race([
+            new Promise(resolve => waiters.push(resolve)),
+            new Promise(resolve => setTimeout(resolve, SETTLE_TIMEOUT_MS))
+        ]),
+        close: () => socket.close()
+    };
+}
+
 // Initialize Speech Recognition
 function initializeSpeechRecognition() {
     if ('webkitSpeechRecognition' in window || 'SpeechRecognition' in window) {
@@ -137,6 +175,26 @@ function initializeSpeechRecognition() {
         let lastSpeechTimestamp = 0;
         let tempMessageElement = null;
         let fullTranscript = '';
+        let punctuatedSegments = [];  // Result index -> promise of that final segment's punctuated text
+        let resultSequence = 0;
+        let punctuationSocket = null;
+        let socketSynced = false;
+        let socketTranscript = '';
+        
+        const showTranscript = (transcript) => {
+            fullTranscript = transcript;
+            userInput.value = fullTranscript;
+            
+            if (tempMessageElement) {
+                tempMessageElement.textContent = fullTranscript;
+                chatContainer.scrollTop = chatContainer.scrollHeight;
+            }
+        };
+        
+        const speechTiming = () => ({
+            duration_seconds: (Date.now() - recordingStartTime) / 1000,
+            pauses: config.pauseCount
+        });
         
         config.recognition.onstart = () => {
             updateStatus('Listening... Speak now.');
@@ -146,8 +204,16 @@ function initializeSpeechRecognition() {
             config.pauseCount = 0;
             config.lastTimerValue = config.timerSeconds;
             fullTranscript = '';
+            punctuatedSegments = [];
             config.messageSent = false;
             
+            socketSynced = false;
+            socketTranscript = '';
+            punctuationSocket = openPunctuationSocket((span) => {
+                socketTranscript = socketTranscript.slice(0, span.start) + span.text + socketTranscript.slice(span.end);
+                showTranscript(socketTranscript);
+            });
+            
             startRecordingButton.disabled = true;
             stopRecordingButton.disabled = false;
             
@@ -159,24 +225,43 @@ function initializeSpeechRecognition() {
         };
 
         config.recognition.onresult = async (event) => {
-            fullTranscript = '';
+            const sequence = ++resultSequence;
             
-            for (let i = 0; i < event.results.length; i++) {
-                if (event.results[i].isFinal) {
-                    const transcript = event.results[i][0].transcript + ' ';
-                    const punctuatedText = await processPunctuation(transcript);
-                    fullTranscript += punctuatedText;
-                } else {
-                    fullTranscript += event.results[i][0].transcript + ' ';
+            if (punctuationSocket && punctuationSocket.isOpen()) {
+                // The first frame on a new socket carries every result, later ones only what changed
+                const results = [];
+                for (let i = socketSynced ? event.resultIndex : 0; i < event.results.length; i++) {
+                    results.push({
+                        index: i,
+                        text: event.results[i][0].transcript,
+                        final: event.results[i].isFinal
+                    });
+                }
+                punctuationSocket.send({ results: results, length: event.results.length });
+                socketSynced = true;
+            } else {
+                // Final results never change, so each one is punctuated once; new ones go out as a single batch
+                const newFinals = [];
+                for (let i = 0; i < event.results.length; i++) {
+                    if (event.results[i].isFinal && !punctuatedSegments[i]) {
+                        newFinals.push(i);
+                    }
+                }
+                if (newFinals.length > 0) {
+                    const batch = punctuateSegments(newFinals.map(i => event.results[i][0].transcript));
+                    newFinals.forEach((resultIndex, position) => {
+                        punctuatedSegments[resultIndex] = batch.then(segments => segments[position]);
+                    });
+                }
+                
+                const segments = await Promise.all(Array.from(event.results, (result, i) =>
+                    result.isFinal ? punctuatedSegments[i] : result[0].transcript
+                ));
+                
+                // A slower, older event must not overwrite the transcript of a newer one
+                if (sequence === resultSequence) {
+                    showTranscript(segments.map(segment => segment.trim()).filter(Boolean).join(' '));
                 }
-            }
-            
-            fullTranscript = fullTranscript.trim();
-            userInput.value = fullTranscript;
-            
-            if (tempMessageElement) {
-                tempMessageElement.textContent = fullTranscript;
-                chatContainer.scrollTop = chatContainer.scrollHeight;
             }
 
             const currentTime = Date.now();
@@ -193,6 +278,9 @@ function initializeSpeechRecognition() {
 
             silenceTimer = setTimeout(async () => {
                 if (hasSpeechDetected && !config.messageSent) {
+                    if (punctuationSocket) {
+                        await punctuationSocket.settled();
+                    }
                     const punctuatedTranscript = await processPunctuation(fullTranscript);
                     
                     if (tempMessageElement) {
@@ -203,10 +291,7 @@ function initializeSpeechRecognition() {
                     stopRecording();
                     
                     userInput.value = punctuatedTranscript;
-                    sendMessage();
-                    setTimeout(() => {
-                        collectSpeechMetadata(punctuatedTranscript, recordingStartTime);
-                    }, 0);
+                    sendMessage(speechTiming());
                 }
             }, SILENCE_THRESHOLD);
         };
@@ -220,6 +305,14 @@ function initializeSpeechRecognition() {
                 clearTimeout(silenceTimer);
             }
             
+            if (punctuationSocket) {
+                // Let the answers to the last recognizer events land before the transcript is sent
+                const socket = punctuationSocket;
+                punctuationSocket = null;
+                await socket.settled();
+                socket.close();
+            }
+            
             if (hasSpeechDetected && fullTranscript.trim() !== '' && !config.messageSent) {
                 const punctuatedTranscript = await processPunctuation(fullTranscript);
                 
@@ -230,10 +323,7 @@ function initializeSpeechRecognition() {
                 
                 config.messageSent = true;
                 userInput.value = punctuatedTranscript;
-                sendMessage();
-                setTimeout(() => {
-                    collectSpeechMetadata(punctuatedTranscript, recordingStartTime);
-                }, 0);
+                sendMessage(speechTiming());
             } else {
                 if (tempMessageElement) {
                     tempMessageElement.remove();
@@ -276,38 +366,6 @@ function stopRecording() {
     }
 }
 
-function collectSpeechMetadata(transcript, startTime) {
-    setTimeout(() => {
-        const elapsedTimeMs = Date.now() - startTime;
-        const elapsedTimeSeconds = elapsedTimeMs / 1000;
-        
-        const words = transcript.trim().split(/\s+/);
-        const wordCount = words.length;
-        const wordsPerMinute = Math.round((wordCount / elapsedTimeSeconds) * 60);
-        
-        const hesitationMarkers = (transcript.match(/um|uh|er|hmm|like|you know/gi) || []).length;
-        
-        let repeatedWords = 0;
-        for (let i = 1; i < words.length; i++) {
-            if (words[i].toLowerCase() === words[i-1].toLowerCase()) {
-                repeatedWords++;
-            }
-        }
-        
-        const metadata = {
-            timestamp: new Date().toISOString(),
-            durationSeconds: elapsedTimeSeconds.toFixed(2),
-            wordCount: wordCount,
-            wordsPerMinute: wordsPerMinute,
-            hesitationMarkers: hesitationMarkers,
-            repeatedWords: repeatedWords,
-            silencesCount: config.pauseCount
-        };
-        
-        config.speechMetadata.push(metadata);
-    }, 0);
-}
-
 function startRecording() {
     if (config.recognition) {
         try {
@@ -339,60 +397,30 @@ function stopSpeaking() {
     }
 }
 
-async function sendMessage(isScoring = false, customPrompt = null) {
-    const userMessage = customPrompt || userInput.value.trim();
+// `speech` carries the timing of a spoken answer; the server derives its fluency features from it
+async function sendMessage(speech = null) {
+    const userMessage = userInput.value.trim();
     
     if (!userMessage) return;
     
-    if (!isScoring || !customPrompt) {
-        addMessage(userMessage, 'user');
-    }
+    addMessage(userMessage, 'user');
     
     userInput.value = '';
-    updateStatus(`Waiting for response using ${isScoring ? config.scoringModel : config.conversationModel}...`);
-    
-    const timeoutPromise = new Promise((_, reject) => {
-        setTimeout(() => reject(new Error('Request timed out after 30 seconds')), 120000);
-    });
+    updateStatus(`Waiting for response using ${config.conversationModel}...`);
     
     try {
-        const history = getConversationHistory();
-        const systemPrompt = config.testPrompts.systemPrompt;
-        const modelToUse = isScoring ? config.scoringModel : config.conversationModel;
+        const sessionId = await ensureSession();
         
-        const fetchPromise = fetch('/api/chat', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                model: modelToUse,
-                messages: [
-                    { role: 'system', content: systemPrompt },
-                    ...history,
-                    { role: 'user', content: userMessage }
-                ],
-                endpoint: config.ollamaEndpoint
-            })
+        await streamTurn({
+            model: config.conversationModel,
+            session_id: sessionId,
+            message: userMessage,
+            endpoint: config.ollamaEndpoint,
+            voice: 'default',
+            codec: config.audioCodec,
+            speech: speech
         });
         
-        const response = await Promise.race([fetchPromise, timeoutPromise]);
-        
-        if (!response.ok) {
-            throw new Error(`HTTP error! Status: ${response.status}`);
-        }
-        
-        const data = await response.json();
-        const examinerResponse = data.response;
-        
-        addMessage(examinerResponse, 'examiner');
-        
-        if (!isScoring) {
-            speakText(examinerResponse);
-        } else {
-            updateStatus('Scoring complete.');
-        }
-        
     } catch (error) {
         console.error('Error calling API:', error);
         updateStatus(`Error: ${error.message}. Please try again with a shorter response or check your connection.`);
@@ -403,96 +431,291 @@ async function sendMessage(isScoring = false, customPrompt = null) {
     }
 }
 
-async function speakText(text) {
-    updateStatus('Generating speech...');
+// POST, waiting out 429 responses for as long as the server's Retry-After header asks
+async function fetchWithRetryAfter(url, options, maxAttempts = 3) {
+    for (let attempt = 1; ; attempt++) {
+        const response = await fetch(url, options);
+        if (response.status !== 429 || attempt >= maxAttempts) {
+            return response;
+        }
+        const retryAfter = parseInt(response.headers.get('Retry-After') || '2', 10);
+        updateStatus(`The examiner is busy. Retrying in ${retryAfter} seconds...`);
+        await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+    }
+}
+
+// Read a server-sent event stream from a fetch response, calling onEvent for each JSON payload
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            const dataLine = rawEvent.split('\n').find(line => line.startsWith('data: '));
+            if (dataLine) {
+                onEvent(JSON.parse(dataLine.slice(6)));
+            }
+        }
+    }
+}
 
-    const ttsPromise = fetch('/api/tts', {
+// Run one examiner turn over a single stream: reply tokens fill a new message bubble while
+// synthesized sentences start playing as soon as the server has them
+async function streamTurn(requestBody) {
+    const response = await fetchWithRetryAfter('/api/turn', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json'
         },
-        body: JSON.stringify({
-            text: text,
-            voice: 'default'
-        })
+        body: JSON.stringify(requestBody)
     });
-
+    
+    if (!response.ok) {
+        if (response.status === 404) {
+            config.sessionPromise = null;  // Session expired on the server
+        }
+        throw new Error(`HTTP error! Status: ${response.status}`);
+    }
+    
+    const messageDiv = document.createElement('div');
+    messageDiv.classList.add('message', 'examiner');
+    chatContainer.appendChild(messageDiv);
+    
     startRecordingButton.disabled = true;
     sendButton.disabled = true;
     userInput.disabled = true;
     stopSpeakingButton.disabled = false;
-
+    
+    const playback = createPlaybackQueue();
+    config.currentAudio = playback;
+    
+    let fullText = '';
+    let audioFailed = false;
     try {
-        const response = await ttsPromise;
+        await readEventStream(response, (event) => {
+            if (event.error) {
+                throw new Error(event.details || event.error);
+            }
+            if (event.token) {
+                fullText += event.token;
+                messageDiv.textContent = fullText;
+                chatContainer.scrollTop = chatContainer.scrollHeight;
+            }
+            if (event.segment && config.currentAudio === playback) {
+                playback.enqueue(`data:${event.segment.mimetype || 'audio/mpeg'};base64,${event.segment.audio}`);
+            }
+            if (event.audio_error) {
+                console.error('Error with TTS:', event.details || event.audio_error);
+                audioFailed = true;
+            }
+        });
+    } catch (error) {
+        if (!fullText) {
+            messageDiv.remove();
+            config.currentAudio = null;
+        }
+        throw error;
+    }
+    
+    if (!fullText) {
+        messageDiv.remove();
+        config.currentAudio = null;
+        throw new Error('Empty response from examiner');
+    }
+    
+    if (config.currentAudio !== playback) {
+        return fullText;  // Playback was stopped while the turn was streaming
+    }
+    if (audioFailed && !playback.received) {
+        // None of the reply could be synthesized in the turn stream; try the standalone TTS path
+        config.currentAudio = null;
+        speakText(fullText);
+    } else {
+        playback.finish();
+    }
+    
+    return fullText;
+}
 
-        if (!response.ok) {
-            throw new Error(`HTTP error! Status: ${response.status}`);
+// Read a newline-delimited JSON stream from a fetch response, calling onItem for each object
+async function readNdjsonStream(response, onItem) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        let newline;
+        while ((newline = buffer.indexOf('\n')) !== -1) {
+            const line = buffer.slice(0, newline).trim();
+            buffer = buffer.slice(newline + 1);
+            if (line) {
+                onItem(JSON.parse(line));
+            }
         }
+    }
+}
 
-        const data = await response.json();
+function finishSpeaking() {
+    updateStatus('Ready for your response.');
+    stopSpeakingButton.disabled = true;
+    config.currentAudio = null;
+    startRecordingButton.disabled = false;
+    sendButton.disabled = false;
+    userInput.disabled = false;
+}
 
-        if (data.error) {
-            throw new Error(data.error);
+// Plays audio segments back to back as they arrive; exposes pause()/currentTime like an Audio element
+function createPlaybackQueue() {
+    const queue = [];
+    let current = null;
+    let finished = false;
+    let stopped = false;
+    
+    const playback = {
+        received: false,
+        currentTime: 0,
+        enqueue(src) {
+            playback.received = true;
+            queue.push(src);
+            if (!current) playNext();
+        },
+        finish() {
+            finished = true;
+            if (!current) playNext();
+        },
+        pause() {
+            stopped = true;
+            queue.length = 0;
+            if (current) current.pause();
         }
+    };
+    
+    function playNext() {
+        if (stopped) return;
+        const src = queue.shift();
+        if (!src) {
+            current = null;
+            if (finished && config.currentAudio === playback) finishSpeaking();
+            return;
+        }
+        current = new Audio(src);
+        current.onplay = () => updateStatus('Examiner is speaking...');
+        current.onended = playNext;
+        current.onerror = () => {
+            console.error('Error playing audio segment');
+            playNext();
+        };
+        current.play();
+    }
+    
+    return playback;
+}
 
-        const audio = new Audio(`data:audio/wav;base64,${data.audio}`);
-        config.currentAudio = audio;
+function speakWithBrowserTTS(text) {
+    if (!('speechSynthesis' in window)) {
+        finishSpeaking();
+        return;
+    }
+    
+    const speech = new SpeechSynthesisUtterance(text);
+    speech.lang = 'en-US';
+    speech.rate = 0.9;
+    speech.pitch = 1;
 
-        audio.onplay = () => {
-            updateStatus('Examiner is speaking...');
-        };
+    speech.onstart = () => {
+        updateStatus('Examiner is speaking (using browser TTS)...');
+    };
 
-        audio.onended = () => {
-            updateStatus('Ready for your response.');
-            stopSpeakingButton.disabled = true;
-            config.currentAudio = null;
-            startRecordingButton.disabled = false;
-            sendButton.disabled = false;
-            userInput.disabled = false;
-        };
+    speech.onend = finishSpeaking;
 
-        audio.onerror = () => {
-            updateStatus('Error playing audio.');
-            stopSpeakingButton.disabled = true;
-            config.currentAudio = null;
-            startRecordingButton.disabled = false;
-            sendButton.disabled = false;
-            userInput.disabled = false;
-        };
+    config.currentAudio = {
+        pause: () => {
+            window.speechSynthesis.cancel();
+        },
+        currentTime: 0
+    };
+
+    window.speechSynthesis.speak(speech);
+}
+
+// Fixed prompts play from the prebuilt audio pack; anything not in the pack is fetched as plain audio
+// over GET, so the browser can cache and range-request it
+function speakFixedPrompt(prompts, audioPack = {}) {
+    startRecordingButton.disabled = true;
+    sendButton.disabled = true;
+    userInput.disabled = true;
+    stopSpeakingButton.disabled = false;
+
+    const playback = createPlaybackQueue();
+    config.currentAudio = playback;
+    prompts.forEach(text => {
+        playback.enqueue(audioPack[text] || `/api/tts?${new URLSearchParams({ text: text, codec: config.audioCodec })}`);
+    });
+    playback.finish();
+}
+
+// The server synthesizes sentences in parallel and streams them in order, so playback starts
+// as soon as the first sentence is ready
+async function speakText(text) {
+    updateStatus('Generating speech...');
+
+    startRecordingButton.disabled = true;
+    sendButton.disabled = true;
+    userInput.disabled = true;
+    stopSpeakingButton.disabled = false;
+
+    const playback = createPlaybackQueue();
+    config.currentAudio = playback;
 
-        audio.play();
+    try {
+        const response = await fetch('/api/tts/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                text: text,
+                voice: 'default',
+                codec: config.audioCodec
+            })
+        });
+
+        if (!response.ok) {
+            throw new Error(`HTTP error! Status: ${response.status}`);
+        }
+
+        await readNdjsonStream(response, (segment) => {
+            if (segment.error) {
+                throw new Error(segment.error);
+            }
+            playback.enqueue(`data:${segment.mimetype || 'audio/mpeg'};base64,${segment.audio}`);
+        });
+        playback.finish();
 
     } catch (error) {
         console.error('Error with TTS:', error);
-        updateStatus('Error generating speech. Falling back to browser TTS.');
-
-        if ('speechSynthesis' in window) {
-            const speech = new SpeechSynthesisUtterance(text);
-            speech.lang = 'en-US';
-            speech.rate = 0.9;
-            speech.pitch = 1;
-
-            speech.onstart = () => {
-                updateStatus('Examiner is speaking (using browser TTS)...');
-            };
-
-            speech.onend = () => {
-                updateStatus('Ready for your response.');
-                stopSpeakingButton.disabled = true;
-                startRecordingButton.disabled = false;
-                sendButton.disabled = false;
-                userInput.disabled = false;
-            };
-
-            config.currentAudio = {
-                pause: () => {
-                    window.speechSynthesis.cancel();
-                },
-                currentTime: 0
-            };
-
-            window.speechSynthesis.speak(speech);
+        if (playback.received) {
+            // Part of the reply is already playing; let it finish rather than starting over
+            playback.finish();
+            return;
+        }
+        if (config.currentAudio !== playback) {
+            return;  // Playback was stopped while waiting for audio
         }
+        updateStatus('Error generating speech. Falling back to browser TTS.');
+        speakWithBrowserTTS(text);
     }
 }
 
@@ -504,19 +727,34 @@ function addMessage(message, sender) {
     chatContainer.scrollTop = chatContainer.scrollHeight;
 }
 
-function getConversationHistory() {
-    const messages = [];
-    const messageElements = chatContainer.querySelectorAll('.message');
-    
-    messageElements.forEach(element => {
-        const role = element.classList.contains('user') ? 'user' : 'assistant';
-        messages.push({
-            role: role,
-            content: element.textContent
+// Start a server-side conversation; the server keeps the history so each turn only sends the new message
+function createSession(greeting = null) {
+    config.sessionPromise = fetch('/api/session', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            greeting: greeting
+        })
+    })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP error! Status: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => data.session_id)
+        .catch(error => {
+            config.sessionPromise = null;
+            throw error;
         });
-    });
     
-    return messages;
+    return config.sessionPromise;
+}
+
+function ensureSession() {
+    return config.sessionPromise || createSession();
 }
 
 function updateStatus(message) {
@@ -547,73 +785,100 @@ function updateTimerDisplay() {
     timerElement.textContent = `${minutes.toString().padStart(2, '0')}:${seconds.toString().padStart(2, '0')}`;
 }
 
-function startTest() {
+async function startTest() {
+    let bank;
+    try {
+        bank = await loadQuestionBank();
+    } catch (error) {
+        console.error('Error loading question bank:', error);
+        updateStatus('Could not load the test questions. Please try again.');
+        return;
+    }
+    
     chatContainer.innerHTML = '';
     config.testActive = true;
-    config.speechMetadata = [];
     config.messageSent = false;
     
     startTimer();
     
-    let introMessage = '';
+    let prompts = [];
     switch (config.currentTestPart) {
         case 1:
-            introMessage = config.testPrompts.part1.intro;
+            prompts = [bank.part1.intro];
             break;
         case 2:
-            const part2Topic = config.testPrompts.part2.topics[
-                Math.floor(Math.random() * config.testPrompts.part2.topics.length)
+            const part2Topic = bank.part2.cue_cards[
+                Math.floor(Math.random() * bank.part2.cue_cards.length)
             ];
-            introMessage = config.testPrompts.part2.intro + " " + part2Topic;
+            prompts = [bank.part2.intro, part2Topic];
             break;
         case 3:
-            const topicKeys = Object.keys(config.testPrompts.part3.topics);
+            const topicKeys = Object.keys(bank.part3.topics);
             const selectedTopic = topicKeys[Math.floor(Math.random() * topicKeys.length)];
-            introMessage = config.testPrompts.part3.intro + " " + 
-                          config.testPrompts.part3.topics[selectedTopic][0];
+            prompts = [bank.part3.intro, bank.part3.topics[selectedTopic][0]];
             break;
     }
+    const introMessage = prompts.join(' ');
     
+    createSession(introMessage).catch(error => console.error('Error creating session:', error));
     addMessage(introMessage, 'examiner');
-    speakText(introMessage);
+    speakFixedPrompt(prompts, bank.audio);
     updateStatus('Test started. Please respond to the examiner.');
     scoreButton.disabled = false;
 }
 
-function requestScoring() {
-    const metadataSummary = generateMetadataSummary();
-    const scoringPrompt = config.testPrompts.scoringPrompt + "\n\n" + metadataSummary;
-    
+// Scoring runs as a background job on the server; progress and the result arrive as server-sent events
+async function requestScoring() {
     updateStatus('Generating IELTS scores using ' + config.scoringModel + '...');
     addMessage("Please evaluate my speaking test performance and provide scores.", 'user');
-    sendMessage(true, scoringPrompt);
-}
-
-function generateMetadataSummary() {
-    if (config.speechMetadata.length === 0) {
-        return "No speech metadata available.";
-    }
-    
-    let totalWords = 0;
-    let totalDuration = 0;
-    let totalHesitations = 0;
-    let totalRepeatedWords = 0;
+    scoreButton.disabled = true;
     
-    config.speechMetadata.forEach(data => {
-        totalWords += data.wordCount;
-        totalDuration += parseFloat(data.durationSeconds);
-        totalHesitations += data.hesitationMarkers;
-        totalRepeatedWords += data.repeatedWords;
-    });
-    
-    const avgWPM = Math.round((totalWords / totalDuration) * 60);
-    
-    return `Speech Metadata Summary:
-- Total responses: ${config.speechMetadata.length}
-- Average speaking rate: ${avgWPM} words per minute
-- Total hesitation markers: ${totalHesitations}
-- Repeated words: ${totalRepeatedWords}
-- Speaking fluidity: ${totalHesitations <= 5 ? "Very fluid" : totalHesitations <= 15 ? "Moderately fluid" : "Less fluid with noticeable hesitations"}`;
+    try {
+        const sessionId = await ensureSession();
+        const response = await fetch('/api/score', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                model: config.scoringModel,
+                session_id: sessionId,
+                endpoint: config.ollamaEndpoint
+            })
+        });
+        
+        if (!response.ok) {
+            if (response.status === 404) {
+                config.sessionPromise = null;  // Session expired on the server
+            }
+            throw new Error(`HTTP error! Status: ${response.status}`);
+        }
+        
+        const { job_id: jobId } = await response.json();
+        const events = new EventSource(`/api/score/${jobId}/events`);
+        
+        events.onmessage = (message) => {
+            const event = JSON.parse(message.data);
+            if (event.type === 'waiting') {
+                updateStatus('Scoring is queued behind other candidates...');
+            } else if (event.type === 'progress') {
+                updateStatus(`Generating IELTS scores... (${event.tokens} tokens so far)`);
+            } else if (event.type === 'done') {
+                events.close();
+                addMessage(event.result, 'examiner');
+                updateStatus('Scoring complete.');
+                scoreButton.disabled = false;
+            } else if (event.type === 'error') {
+                events.close();
+                updateStatus(`Error: ${event.error}. Please try scoring again.`);
+                scoreButton.disabled = false;
+            }
+        };
+    } catch (error) {
+        console.error('Error requesting scoring:', error);
+        updateStatus(`Error: ${error.message}. Please try scoring again.`);
+        scoreButton.disabled = false;
+    }
 }
 
 function saveSettings() {